@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
 from app.db.connection import get_db
+from app.db.pagination import doc_cursor
 
 from app.services.admin_service import (
     is_admin,
     get_pending_claims,
+    get_user_ledger_entries,
+    build_month_stats_text,
     approve_share_claim,
     reject_share_claim,
 )
+from app.services.economy_config import describe_config, set_economy_value
 from app.services.redeem_service import (
     activate_plus_by_points,
     activate_premium_by_points,
@@ -21,7 +27,6 @@ from app.services.security_service import (
     apply_next_infraction,
 )
 from app.services.tiers_service import (
-    refresh_tiers,
     get_multiplier,
     admin_set_elite,
     admin_set_titan,
@@ -38,6 +43,7 @@ from app.bot.keyboards.admin_menu import (
     admin_pending_list_kb,
     admin_claim_actions_kb,
     admin_user_actions_kb,
+    admin_user_ledger_kb,
     admin_infraction_confirm_kb,
     admin_tiers_kb,
 )
@@ -70,12 +76,52 @@ def _tiers_status_kb(user_id: int) -> InlineKeyboardMarkup:
     )
 
 
+async def _keyset_page(
+    fetch: Callable[..., Awaitable[List[Dict[str, Any]]]],
+    direction: str,
+    cursor: Optional[str],
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+    """
+    Una página keyset de PAGE_SIZE con fetch(limit, after, before).
+    direction: "n" (siguiente), "p" (anterior) o "" (inicio).
+    Retorna (filas, cursor anterior, cursor siguiente); sin página vecina => None.
+    """
+    rows: List[Dict[str, Any]] = []
+    has_prev = has_next = False
+    if direction == "p":
+        rows = await fetch(limit=PAGE_SIZE + 1, before=cursor)
+        has_prev = len(rows) > PAGE_SIZE
+        rows = rows[-PAGE_SIZE:]
+        if rows:
+            # Sonda de 1 fila: lo que seguía pudo cambiar mientras tanto
+            probe = await fetch(limit=1, after=doc_cursor(rows[-1]))
+            has_next = bool(probe)
+    elif direction == "n":
+        rows = await fetch(limit=PAGE_SIZE + 1, after=cursor)
+        has_next = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+        has_prev = True
+
+    if not rows:
+        # Inicio, o la página pedida quedó vacía (filas que ya no aplican):
+        # se vuelve a la primera página.
+        rows = await fetch(limit=PAGE_SIZE + 1)
+        has_next = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+        has_prev = False
+
+    return (
+        rows,
+        doc_cursor(rows[0]) if rows and has_prev else None,
+        doc_cursor(rows[-1]) if rows and has_next else None,
+    )
+
+
 async def _render_user_panel_text(user_id: int) -> str:
     ok, _, snap = await get_user_security_snapshot(user_id)
     if not ok or not snap:
         return "Usuario no encontrado."
 
-    await refresh_tiers(user_id)
     mult = await get_multiplier(user_id)
 
     inf_count = int(((snap.get("infractions") or {}).get("count")) or 0)
@@ -98,7 +144,6 @@ async def _render_user_panel_text(user_id: int) -> str:
 async def _render_tiers_panel_text(user_id: int) -> str:
     db = get_db()
 
-    await refresh_tiers(user_id)
     u = await db.users.find_one(
         {"telegram_id": user_id},
         {"elite": 1, "titan": 1, "status": 1},
@@ -140,6 +185,30 @@ async def admin_cmd(message: Message):
     )
 
 
+@router.message(Command("econ"))
+async def admin_econ(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ Sin acceso.")
+        return
+
+    await message.answer(describe_config())
+
+
+@router.message(Command("econ_set"))
+async def admin_econ_set(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ Sin acceso.")
+        return
+
+    parts = (message.text or "").split()
+    if len(parts) != 3:
+        await message.answer("Formato inválido. Ejemplo: <code>/econ_set cost_plus 300</code>")
+        return
+
+    ok, msg = await set_economy_value(parts[1].strip(), parts[2], message.from_user.id)
+    await message.answer(msg if ok else f"⚠️ {msg}")
+
+
 @router.callback_query(F.data == "admin:home")
 async def admin_home(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
@@ -176,6 +245,17 @@ async def admin_winners_help(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(F.data == "admin:stats")
+async def admin_month_stats(callback: CallbackQuery):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Sin acceso.", show_alert=True)
+        return
+
+    text = await build_month_stats_text()
+    await callback.message.edit_text(text, reply_markup=admin_home_kb())
+    await callback.answer()
+
+
 @router.callback_query(F.data == "admin:redeem_help")
 async def admin_redeem_help(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
@@ -201,20 +281,17 @@ async def admin_pending(callback: CallbackQuery):
         await callback.answer("⛔ Sin acceso.", show_alert=True)
         return
 
-    try:
-        page = int(callback.data.split(":")[-1])
-    except Exception:
-        page = 0
+    # admin:pending:0 (inicio) | admin:pending:n:<cursor> | admin:pending:p:<cursor>
+    parts = callback.data.split(":", 3)
+    direction = parts[2] if len(parts) == 4 else ""
+    cursor = parts[3] if len(parts) == 4 else None
 
-    skip = page * PAGE_SIZE
-    claims = await get_pending_claims(limit=PAGE_SIZE + 1, skip=skip)
-    has_more = len(claims) > PAGE_SIZE
-    claims = claims[:PAGE_SIZE]
+    claims, prev_cursor, next_cursor = await _keyset_page(get_pending_claims, direction, cursor)
 
     if not claims:
         await callback.message.edit_text(
             "📥 <b>Pendientes</b>\n\nNo hay evidencias pendientes.",
-            reply_markup=admin_pending_list_kb(page=0, has_more=False),
+            reply_markup=admin_pending_list_kb(prev_cursor=None, next_cursor=None),
         )
         await callback.answer()
         return
@@ -237,7 +314,7 @@ async def admin_pending(callback: CallbackQuery):
 
     await callback.message.edit_text(
         "\n".join(lines),
-        reply_markup=admin_pending_list_kb(page=page, has_more=has_more),
+        reply_markup=admin_pending_list_kb(prev_cursor=prev_cursor, next_cursor=next_cursor),
     )
     await callback.answer()
 
@@ -328,6 +405,44 @@ async def admin_back_to_user_panel(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(F.data.startswith("admin:ledger:"))
+async def admin_user_ledger(callback: CallbackQuery):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Sin acceso.", show_alert=True)
+        return
+
+    # admin:ledger:<id> (inicio) | admin:ledger:<id>:n:<cursor> | admin:ledger:<id>:p:<cursor>
+    parts = callback.data.split(":", 4)
+    try:
+        user_id = int(parts[2])
+    except Exception:
+        await callback.answer("ID inválido.", show_alert=True)
+        return
+    direction = parts[3] if len(parts) == 5 else ""
+    cursor = parts[4] if len(parts) == 5 else None
+
+    async def fetch(limit: int, after: Optional[str] = None, before: Optional[str] = None):
+        return await get_user_ledger_entries(user_id, limit=limit, after=after, before=before)
+
+    entries, prev_cursor, next_cursor = await _keyset_page(fetch, direction, cursor)
+
+    lines = [f"🧾 <b>Movimientos</b> de <code>{user_id}</code>\n"]
+    if not entries:
+        lines.append("Sin movimientos.")
+    for e in entries:
+        signed = int(e.get("signed_points") or 0)
+        lines.append(
+            f"• {_fmt_dt(e.get('created_at'))} · <b>{signed:+d}</b> · "
+            f"<code>{e.get('reason_code') or '—'}</code>"
+        )
+
+    await callback.message.edit_text(
+        "\n".join(lines),
+        reply_markup=admin_user_ledger_kb(user_id, prev_cursor=prev_cursor, next_cursor=next_cursor),
+    )
+    await callback.answer()
+
+
 @router.callback_query(F.data.startswith("admin:actplus:"))
 async def admin_activate_plus(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
@@ -589,7 +704,6 @@ async def admin_tiers_status_cmd(message: Message):
 
     db = get_db()
 
-    await refresh_tiers(user_id)
     mult_now = await get_multiplier(user_id)
 
     u = await db.users.find_one(
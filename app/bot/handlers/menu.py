@@ -6,10 +6,12 @@ from datetime import datetime
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
-from app.db.connection import get_db
+from app.db.request_context import get_user_doc
 from app.bot.keyboards.main_menu import main_menu_kb
 from app.bot.keyboards.tasks_menu import tasks_menu_kb
-from app.services.tiers_service import get_multiplier, refresh_tiers
+from app.services.economy_config import get_config
+from app.services.periods import month_key_utc
+from app.services.tiers_service import get_multiplier
 
 
 router = Router()
@@ -25,23 +27,15 @@ def _fmt_dt(dt) -> str:
 
 @router.callback_query(F.data.startswith("menu:"))
 async def menu_router(callback: CallbackQuery):
-    db = get_db()
     telegram_id = callback.from_user.id
 
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
-        {"$set": {"last_seen_at": datetime.utcnow()}},
-        upsert=True,
-    )
-
     action = callback.data.split(":", 1)[1]
 
     if action == "points":
-        await refresh_tiers(telegram_id)
         mult = await get_multiplier(telegram_id)
 
-        user = await db.users.find_one(
-            {"telegram_id": telegram_id},
+        user = await get_user_doc(
+            telegram_id,
             {
                 "points": 1,
                 "ascenso_plan": 1,
@@ -79,7 +73,7 @@ async def menu_router(callback: CallbackQuery):
         titan_until = (user.get("titan") or {}).get("active_until")
         prem_redeems = int(((user.get("titan") or {}).get("premium_redeems_count")) or 0)
 
-        month_key = ((user.get("rank") or {}).get("month_key")) or datetime.utcnow().strftime("%Y-%m")
+        month_key = ((user.get("rank") or {}).get("month_key")) or month_key_utc(datetime.utcnow())
         earned_month = int(((user.get("rank") or {}).get("earned_this_month")) or 0)
 
         level_badge = "FREE"
@@ -128,8 +122,8 @@ async def menu_router(callback: CallbackQuery):
         await callback.message.edit_text(
             "🛒 <b>Canjear plan</b>\n\n"
             "Costos:\n"
-            "• 🥈 PLUS: <b>250</b> pts\n"
-            "• 🥇 PREMIUM: <b>400</b> pts\n\n"
+            f"• 🥈 PLUS: <b>{get_config().cost_plus}</b> pts\n"
+            f"• 🥇 PREMIUM: <b>{get_config().cost_premium}</b> pts\n\n"
             "Selecciona el plan que deseas solicitar al admin.",
             reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[
@@ -3,8 +3,14 @@ from __future__ import annotations
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
-from app.services.ranking_service import build_ranking_text
-from app.bot.keyboards.ranking_menu import ranking_kb
+from app.services.ranking_service import build_around_text, build_period_ranking_text, build_ranking_text
+from app.services.ranking_history_service import build_history_month_text, build_history_months_text
+from app.bot.keyboards.ranking_menu import (
+    ranking_around_kb,
+    ranking_history_kb,
+    ranking_history_month_kb,
+    ranking_kb,
+)
 
 router = Router()
 
@@ -14,3 +20,40 @@ async def ranking_home(callback: CallbackQuery):
     text = await build_ranking_text(callback.from_user.id)
     await callback.message.edit_text(text, reply_markup=ranking_kb())
     await callback.answer()
+
+
+@router.callback_query(F.data.in_({"rank:week", "rank:all"}))
+async def ranking_period(callback: CallbackQuery):
+    period = callback.data.split(":", 1)[1]
+    text = await build_period_ranking_text(callback.from_user.id, period)
+    await callback.message.edit_text(text, reply_markup=ranking_kb(period))
+    await callback.answer()
+
+
+@router.callback_query(F.data == "rank:around")
+async def ranking_around(callback: CallbackQuery):
+    text = await build_around_text(callback.from_user.id)
+    await callback.message.edit_text(text, reply_markup=ranking_around_kb())
+    await callback.answer()
+
+
+@router.callback_query(F.data == "rank:history")
+async def ranking_history(callback: CallbackQuery):
+    text, months = await build_history_months_text()
+    await callback.message.edit_text(text, reply_markup=ranking_history_kb(months))
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("rank:history:"))
+async def ranking_history_month(callback: CallbackQuery):
+    # rank:history:<YYYY-MM>[:<page>]
+    parts = (callback.data or "").split(":")
+    month_key = parts[2] if len(parts) > 2 else ""
+    try:
+        page = int(parts[3]) if len(parts) > 3 else 0
+    except ValueError:
+        page = 0
+
+    text, has_prev, has_next = await build_history_month_text(callback.from_user.id, month_key, page)
+    await callback.message.edit_text(text, reply_markup=ranking_history_month_kb(month_key, page, has_prev, has_next))
+    await callback.answer()
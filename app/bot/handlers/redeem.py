@@ -4,6 +4,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
 from app.bot.keyboards.redeem_menu import redeem_menu_kb
+from app.services.economy_config import get_config
 from app.services.redeem_request_service import build_redeem_request_text, get_admin_whatsapp_url
 
 router = Router()
@@ -14,8 +15,8 @@ async def redeem_home(callback: CallbackQuery):
     await callback.message.edit_text(
         "🛒 <b>Canjear plan</b>\n\n"
         "Costos:\n"
-        "• 🥈 PLUS: <b>250</b> pts\n"
-        "• 🥇 PREMIUM: <b>400</b> pts\n\n"
+        f"• 🥈 PLUS: <b>{get_config().cost_plus}</b> pts\n"
+        f"• 🥇 PREMIUM: <b>{get_config().cost_premium}</b> pts\n\n"
         "Selecciona el plan que deseas solicitar al admin.",
         reply_markup=redeem_menu_kb(),
     )
@@ -7,6 +7,7 @@ from aiogram.types import CallbackQuery, Message
 from datetime import datetime
 
 from app.services.admin_service import is_admin
+from app.services.periods import month_key_utc
 from app.services.winners_service import (
     build_winners_public_text,
     build_winners_admin_text,
@@ -66,7 +67,7 @@ async def winners_set_cmd(message: Message):
         )
         return
 
-    mk = datetime.utcnow().strftime("%Y-%m")
+    mk = month_key_utc(datetime.utcnow())
     ok, msg = await upsert_winner(
         month_key=mk,
         position=pos,
@@ -86,6 +87,6 @@ async def winners_clear_cmd(message: Message):
         await message.answer("⛔ Sin acceso.")
         return
 
-    mk = datetime.utcnow().strftime("%Y-%m")
+    mk = month_key_utc(datetime.utcnow())
     ok, msg = await clear_winners(month_key=mk, admin_id=message.from_user.id)
     await message.answer(msg)
@@ -1,5 +1,9 @@
+from typing import Optional
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from app.services.economy_config import get_config
+
 
 def admin_home_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
@@ -7,18 +11,22 @@ def admin_home_kb() -> InlineKeyboardMarkup:
             [InlineKeyboardButton(text="📥 Pendientes (Compartir)", callback_data="admin:pending:0")],
             [InlineKeyboardButton(text="🛒 Activar Plan (por ID)", callback_data="admin:redeem_help")],
             [InlineKeyboardButton(text="🏆 Ganadores del Mes", callback_data="admin:winners_help")],
+            [InlineKeyboardButton(text="📊 Stats del Mes", callback_data="admin:stats")],
         ]
     )
 
 
-def admin_pending_list_kb(page: int, has_more: bool) -> InlineKeyboardMarkup:
+def admin_pending_list_kb(prev_cursor: Optional[str], next_cursor: Optional[str]) -> InlineKeyboardMarkup:
+    """
+    Navegación keyset: admin:pending:p:<cursor> (anterior) / admin:pending:n:<cursor> (siguiente).
+    """
     buttons = []
 
     nav_row = []
-    if page > 0:
-        nav_row.append(InlineKeyboardButton(text="⬅️ Anterior", callback_data=f"admin:pending:{page-1}"))
-    if has_more:
-        nav_row.append(InlineKeyboardButton(text="➡️ Siguiente", callback_data=f"admin:pending:{page+1}"))
+    if prev_cursor:
+        nav_row.append(InlineKeyboardButton(text="⬅️ Anterior", callback_data=f"admin:pending:p:{prev_cursor}"))
+    if next_cursor:
+        nav_row.append(InlineKeyboardButton(text="➡️ Siguiente", callback_data=f"admin:pending:n:{next_cursor}"))
     if nav_row:
         buttons.append(nav_row)
 
@@ -39,11 +47,12 @@ def admin_claim_actions_kb(claim_id: str) -> InlineKeyboardMarkup:
 
 
 def admin_user_actions_kb(user_telegram_id: int) -> InlineKeyboardMarkup:
+    cfg = get_config()
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="🥈 Activar PLUS (250)", callback_data=f"admin:actplus:{user_telegram_id}"),
-                InlineKeyboardButton(text="🥇 Activar PREMIUM (400)", callback_data=f"admin:actprem:{user_telegram_id}"),
+                InlineKeyboardButton(text=f"🥈 Activar PLUS ({cfg.cost_plus})", callback_data=f"admin:actplus:{user_telegram_id}"),
+                InlineKeyboardButton(text=f"🥇 Activar PREMIUM ({cfg.cost_premium})", callback_data=f"admin:actprem:{user_telegram_id}"),
             ],
             [
                 InlineKeyboardButton(text="⚖️ Aplicar sanción (1→2→3)", callback_data=f"admin:infraction:{user_telegram_id}"),
@@ -51,11 +60,36 @@ def admin_user_actions_kb(user_telegram_id: int) -> InlineKeyboardMarkup:
             [
                 InlineKeyboardButton(text="⭐ Gestionar Elite/Titan", callback_data=f"admin:tiers:{user_telegram_id}"),
             ],
+            [
+                InlineKeyboardButton(text="🧾 Movimientos", callback_data=f"admin:ledger:{user_telegram_id}"),
+            ],
             [InlineKeyboardButton(text="🏠 Admin Home", callback_data="admin:home")],
         ]
     )
 
 
+def admin_user_ledger_kb(
+    user_telegram_id: int,
+    prev_cursor: Optional[str],
+    next_cursor: Optional[str],
+) -> InlineKeyboardMarkup:
+    """
+    Navegación keyset: admin:ledger:<id>:p:<cursor> (más nuevos) / admin:ledger:<id>:n:<cursor> (más viejos).
+    """
+    buttons = []
+
+    nav_row = []
+    if prev_cursor:
+        nav_row.append(InlineKeyboardButton(text="⬅️ Anterior", callback_data=f"admin:ledger:{user_telegram_id}:p:{prev_cursor}"))
+    if next_cursor:
+        nav_row.append(InlineKeyboardButton(text="➡️ Siguiente", callback_data=f"admin:ledger:{user_telegram_id}:n:{next_cursor}"))
+    if nav_row:
+        buttons.append(nav_row)
+
+    buttons.append([InlineKeyboardButton(text="⬅️ Volver", callback_data=f"admin:backuser:{user_telegram_id}")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 def admin_infraction_confirm_kb(user_telegram_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
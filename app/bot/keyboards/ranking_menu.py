@@ -1,10 +1,60 @@
+from typing import List
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 
-def ranking_kb() -> InlineKeyboardMarkup:
+_PERIOD_BUTTONS = [
+    ("month", "📈 Mes", "rank:home"),
+    ("week", "📅 Semana", "rank:week"),
+    ("all", "🏛️ Histórico", "rank:all"),
+]
+
+
+def ranking_kb(period: str = "month") -> InlineKeyboardMarkup:
+    switch = [
+        InlineKeyboardButton(text=f"· {text} ·" if key == period else text, callback_data=data)
+        for key, text, data in _PERIOD_BUTTONS
+    ]
+    refresh = next(data for key, _, data in _PERIOD_BUTTONS if key == period)
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="🔄 Actualizar", callback_data="rank:home")],
+            switch,
+            [InlineKeyboardButton(text="🔄 Actualizar", callback_data=refresh)],
+            [InlineKeyboardButton(text="👥 Cerca de mí", callback_data="rank:around")],
+            [InlineKeyboardButton(text="🗂️ Meses anteriores", callback_data="rank:history")],
             [InlineKeyboardButton(text="⬅️ Volver", callback_data="menu:home")],
         ]
     )
+
+
+def ranking_around_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🔄 Actualizar", callback_data="rank:around")],
+            [InlineKeyboardButton(text="⬅️ Ranking", callback_data="rank:home")],
+        ]
+    )
+
+
+def ranking_history_kb(month_keys: List[str]) -> InlineKeyboardMarkup:
+    rows = []
+    for i in range(0, len(month_keys), 3):
+        rows.append(
+            [InlineKeyboardButton(text=mk, callback_data=f"rank:history:{mk}") for mk in month_keys[i:i + 3]]
+        )
+    rows.append([InlineKeyboardButton(text="⬅️ Ranking", callback_data="rank:home")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def ranking_history_month_kb(month_key: str, page: int, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    rows = []
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(text="⬅️ Anterior", callback_data=f"rank:history:{month_key}:{page - 1}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Siguiente ➡️", callback_data=f"rank:history:{month_key}:{page + 1}"))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text="🗂️ Meses", callback_data="rank:history")])
+    rows.append([InlineKeyboardButton(text="⬅️ Ranking", callback_data="rank:home")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
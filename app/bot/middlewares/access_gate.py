@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.services.access_gate import STATE_BANNED, gate_state
+from app.services.admin_service import is_admin
+
+logger = logging.getLogger(__name__)
+
+# A un mensaje de un usuario bloqueado se responde como mucho una vez por ventana
+_MESSAGE_REPLY_WINDOW = 60.0
+
+BANNED_TEXT = "🚫 Estás expulsado del sistema."
+
+
+def _blocked_text(until) -> str:
+    if until is None:
+        return "⛔ Estás bloqueado temporalmente."
+    return f"⛔ Estás bloqueado hasta: {until.strftime('%Y-%m-%d %H:%M UTC')}"
+
+
+class AccessGateMiddleware(BaseMiddleware):
+    """
+    Outer middleware del Dispatcher (nivel Update), ANTES de RequestContextMiddleware:
+    si el usuario está baneado o bloqueado (estado en memoria, ver access_gate),
+    responde con un texto fijo y corta el update sin tocar Mongo ni handlers.
+    Los admins nunca se cortan.
+    """
+
+    def __init__(self) -> None:
+        self._last_reply: Dict[int, float] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tg_user = data.get("event_from_user")
+        if tg_user is None:
+            return await handler(event, data)
+
+        state, until = gate_state(tg_user.id)
+        if state is None or is_admin(tg_user.id):
+            return await handler(event, data)
+
+        text = BANNED_TEXT if state == STATE_BANNED else _blocked_text(until)
+        try:
+            await self._reply(event, tg_user.id, text)
+        except Exception:
+            logger.debug("Access gate reply failed for user %s", tg_user.id, exc_info=True)
+        return None
+
+    async def _reply(self, event: TelegramObject, telegram_id: int, text: str) -> None:
+        if not isinstance(event, Update):
+            return
+        if event.callback_query is not None:
+            # Siempre: cierra el "cargando" del botón
+            await event.callback_query.answer(text, show_alert=True)
+            return
+        if event.message is not None:
+            now = time.monotonic()
+            if now - self._last_reply.get(telegram_id, 0.0) < _MESSAGE_REPLY_WINDOW:
+                return
+            if len(self._last_reply) > 10000:
+                self._last_reply.clear()
+            self._last_reply[telegram_id] = now
+            await event.message.answer(text)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.db.request_context import close_context, current_context, load_context_user, open_context
+from app.services.last_seen_buffer import touch
+
+logger = logging.getLogger(__name__)
+
+
+class RequestContextMiddleware(BaseMiddleware):
+    """
+    Outer middleware del Dispatcher (nivel Update):
+    carga el usuario UNA vez por update en el RequestContext, para que los
+    services lo lean/escriban desde ahí, y loguea los round trips a Mongo.
+    La actividad (last_seen_at) se anota en memoria y se escribe en lote.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tg_user = data.get("event_from_user")
+        if tg_user is None:
+            return await handler(event, data)
+
+        touch(tg_user.id)
+        token = open_context(tg_user.id)
+        ctx = current_context()
+        started = time.perf_counter()
+        try:
+            await load_context_user()
+            return await handler(event, data)
+        finally:
+            close_context(token)
+            logger.debug(
+                "update=%s user=%s mongo_round_trips=%d elapsed_ms=%.1f",
+                getattr(event, "update_id", "?"),
+                tg_user.id,
+                ctx.round_trips,
+                (time.perf_counter() - started) * 1000,
+            )
@@ -1,24 +1,50 @@
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
 
+from app.db.indexes import ensure_indexes
+
 load_dotenv()
 
 client = None
 db = None
+_supports_transactions = False
 
 
 async def init_db():
-    global client, db
+    global client, db, _supports_transactions
     mongo_uri = os.getenv("MONGO_URI")
     db_name = os.getenv("MONGO_DB_NAME", "mtf_ascenso")
 
     if not mongo_uri:
         raise ValueError("MONGO_URI not found in environment variables")
 
-    client = AsyncIOMotorClient(mongo_uri)
+    # import local para evitar ciclos (request_context usa get_db)
+    from app.db.request_context import RoundTripCounter
+
+    client = AsyncIOMotorClient(mongo_uri, event_listeners=[RoundTripCounter()])
     db = client[db_name]
 
+    # Transacciones multi-documento: solo en replica set / sharded (Atlas sí)
+    try:
+        hello = await client.admin.command("hello")
+    except OperationFailure:
+        # servidores < 4.4.2
+        hello = await client.admin.command("isMaster")
+    _supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+    # Crea índices faltantes y reporta drift; solo un unique faltante corta el arranque
+    await ensure_indexes(db)
+
 
 def get_db():
     return db
+
+
+def get_client():
+    return client
+
+
+def supports_transactions() -> bool:
+    return _supports_transactions
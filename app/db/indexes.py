@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+# Registro declarativo de índices: colección -> lista de specs.
+# Cada spec: name (explícito, para detectar drift), keys y opciones de create_index.
+INDEX_REGISTRY: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"name": "uniq_telegram_id", "keys": [("telegram_id", ASCENDING)], "unique": True},
+        {
+            "name": "rank_month_earned",
+            "keys": [
+                ("rank.month_key", ASCENDING),
+                ("rank.earned_this_month", DESCENDING),
+                ("telegram_id", ASCENDING),
+            ],
+        },
+        # Mes cerrado por el rollover lazy (snapshot antes del reset global)
+        {
+            "name": "rank_prev_month_earned",
+            "keys": [
+                ("rank.prev_month_key", ASCENDING),
+                ("rank.earned_prev_month", DESCENDING),
+                ("telegram_id", ASCENDING),
+            ],
+        },
+        {
+            "name": "rank_week_earned",
+            "keys": [
+                ("rank.week_key", ASCENDING),
+                ("rank.earned_this_week", DESCENDING),
+                ("telegram_id", ASCENDING),
+            ],
+        },
+        {
+            "name": "rank_all_time",
+            "keys": [("rank.earned_all_time", DESCENDING), ("telegram_id", ASCENDING)],
+        },
+        # Barrido de tiers vencidos: solo indexa los activos
+        {
+            "name": "elite_active_until",
+            "keys": [("elite.active_until", ASCENDING)],
+            "partialFilterExpression": {"elite.active": True},
+        },
+        {
+            "name": "titan_active_until",
+            "keys": [("titan.active_until", ASCENDING)],
+            "partialFilterExpression": {"titan.active": True},
+        },
+        # Carga del gate de acceso (baneados/bloqueados son pocos)
+        {"name": "status_state", "keys": [("status.state", ASCENDING)]},
+        # Barrido de planes y bloqueos vencidos: solo indexa los que tienen fecha
+        {
+            "name": "plan_expires_at",
+            "keys": [("ascenso_plan.expires_at", ASCENDING)],
+            "partialFilterExpression": {"ascenso_plan.expires_at": {"$type": "date"}},
+        },
+        {
+            "name": "blocked_until",
+            "keys": [("status.blocked_until", ASCENDING)],
+            "partialFilterExpression": {"status.blocked_until": {"$type": "date"}},
+        },
+    ],
+    "ledger": [
+        {"name": "uniq_entry_id", "keys": [("entry_id", ASCENDING)], "unique": True},
+        # Entries sin transacción cuyo cache aún no se confirmó (reconciliador)
+        {
+            "name": "cache_pending",
+            "keys": [("created_at", ASCENDING)],
+            "partialFilterExpression": {"cache_applied": False},
+        },
+        {
+            "name": "user_created",
+            "keys": [("telegram_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        },
+    ],
+    "task_claims": [
+        {
+            "name": "user_task_day",
+            "keys": [("telegram_id", ASCENDING), ("task_code", ASCENDING), ("day_key", ASCENDING)],
+        },
+        {
+            "name": "status_created",
+            "keys": [("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+        },
+    ],
+    "monthly_winners": [
+        {"name": "month_key", "keys": [("month_key", ASCENDING)]},
+    ],
+    # Un snapshot por mes: el índice corta rollovers concurrentes o retomados
+    "month_snapshots": [
+        {"name": "month_key", "keys": [("month_key", ASCENDING)], "unique": True},
+    ],
+    "notifications": [
+        {
+            "name": "pending_created",
+            "keys": [("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+            "partialFilterExpression": {"status": "pending"},
+        },
+        # Los enviados se borran solos a los 30 días
+        {"name": "sent_ttl", "keys": [("sent_at", ASCENDING)], "expireAfterSeconds": 30 * 24 * 3600},
+    ],
+}
+
+# Opciones que comparamos contra el índice vivo para detectar drift
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _normalize_keys(keys: List[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+    # index_information() devuelve direcciones como int (o float en índices viejos)
+    out = []
+    for field, direction in keys:
+        if isinstance(direction, float):
+            direction = int(direction)
+        out.append((field, direction))
+    return out
+
+
+def _spec_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in spec.items() if k not in ("name", "keys")}
+
+
+def _live_options(info: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: info[k] for k in _COMPARED_OPTIONS if k in info}
+
+
+def _diff(spec: Dict[str, Any], info: Dict[str, Any]) -> List[str]:
+    problems: List[str] = []
+    if _normalize_keys(spec["keys"]) != _normalize_keys(info.get("key") or []):
+        problems.append(f"keys {info.get('key')} != {spec['keys']}")
+
+    wanted = _spec_options(spec)
+    live = _live_options(info)
+    for opt in _COMPARED_OPTIONS:
+        # unique=False equivale a no tener la opción
+        w = None if wanted.get(opt) is False else wanted.get(opt)
+        l = None if live.get(opt) is False else live.get(opt)
+        if w != l:
+            problems.append(f"{opt}: live={l!r} wanted={w!r}")
+    return problems
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Aplica el registro de índices y verifica drift contra los índices vivos.
+    - Crea los que faltan.
+    - Si un índice existe con el mismo nombre pero distinta definición, NO lo toca
+      (requiere decisión manual), solo lo reporta.
+    - Reporta índices vivos que no están en el registro.
+    Un fallo en un índice normal se loguea y el bot sigue arrancando. Los unique
+    sostienen garantías del código (ej: reintento de entry_id, un snapshot por
+    mes): si alguno no queda vivo y unique (duplicados, drift), lanza
+    RuntimeError y el arranque se corta.
+
+    Retorna un reporte {created, drift, unknown, failed}.
+    """
+    report: Dict[str, List[str]] = {"created": [], "drift": [], "unknown": [], "failed": []}
+
+    for coll_name, specs in INDEX_REGISTRY.items():
+        coll = db[coll_name]
+        try:
+            live = await coll.index_information()
+        except OperationFailure:
+            # colección inexistente en algunos servidores: no hay índices vivos
+            live = {}
+
+        # Mismas keys con otro nombre: lo tratamos como drift, no lo duplicamos
+        live_by_keys = {
+            tuple(_normalize_keys(info.get("key") or [])): name for name, info in live.items()
+        }
+
+        for spec in specs:
+            name = spec["name"]
+            ref = f"{coll_name}.{name}"
+
+            if name in live:
+                problems = _diff(spec, live[name])
+                if problems:
+                    report["drift"].append(f"{ref}: {'; '.join(problems)}")
+                continue
+
+            other = live_by_keys.get(tuple(_normalize_keys(spec["keys"])))
+            if other:
+                report["drift"].append(f"{ref}: existe con otro nombre ({other})")
+                continue
+
+            try:
+                await coll.create_index(spec["keys"], name=name, **_spec_options(spec))
+                report["created"].append(ref)
+            except OperationFailure as e:
+                report["failed"].append(f"{ref}: {e}")
+
+        known = {s["name"] for s in specs} | {"_id_"}
+        for name in live:
+            if name not in known:
+                report["unknown"].append(f"{coll_name}.{name}")
+
+    for ref in report["created"]:
+        logger.info("Index created: %s", ref)
+    for ref in report["drift"]:
+        logger.warning("Index drift: %s", ref)
+    for ref in report["failed"]:
+        logger.error("Index creation failed: %s", ref)
+    for ref in report["unknown"]:
+        logger.info("Index not in registry: %s", ref)
+
+    logger.info(
+        "Indexes checked: created=%d drift=%d failed=%d unknown=%d",
+        len(report["created"]),
+        len(report["drift"]),
+        len(report["failed"]),
+        len(report["unknown"]),
+    )
+
+    missing = await _missing_unique_indexes(db)
+    if missing:
+        raise RuntimeError(f"Unique indexes missing (fix data/indexes before starting): {', '.join(missing)}")
+    return report
+
+
+async def _missing_unique_indexes(db) -> List[str]:
+    """
+    Índices unique del registro que no existen vivos con las mismas keys y unique.
+    """
+    missing: List[str] = []
+    for coll_name, specs in INDEX_REGISTRY.items():
+        wanted = [s for s in specs if s.get("unique")]
+        if not wanted:
+            continue
+        try:
+            live = await db[coll_name].index_information()
+        except OperationFailure:
+            live = {}
+        live_unique = {
+            tuple(_normalize_keys(info.get("key") or [])) for info in live.values() if info.get("unique")
+        }
+        for spec in wanted:
+            if tuple(_normalize_keys(spec["keys"])) not in live_unique:
+                missing.append(f"{coll_name}.{spec['name']}")
+    return missing
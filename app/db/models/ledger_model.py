@@ -4,17 +4,58 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from app.db.connection import get_db
+from app.db.pagination import decode_cursor, keyset_filter
 
 
-async def create_ledger_entry(entry: Dict[str, Any]) -> str:
+async def create_ledger_entry(entry: Dict[str, Any], session=None) -> str:
     """
     Inserta un movimiento (ledger entry). Retorna el _id insertado como string.
     """
     db = get_db()
-    res = await db.ledger.insert_one(entry)
+    res = await db.ledger.insert_one(entry, session=session)
     return str(res.inserted_id)
 
 
+async def create_ledger_entries(entries: List[Dict[str, Any]], session=None) -> int:
+    """
+    Inserta varios movimientos en un solo insert_many (en orden: si uno falla,
+    los siguientes no se insertan). Retorna cuántos se insertaron.
+    """
+    if not entries:
+        return 0
+    db = get_db()
+    res = await db.ledger.insert_many(entries, ordered=True, session=session)
+    return len(res.inserted_ids)
+
+
+async def mark_ledger_cache_applied(entry_ids: List[str]) -> None:
+    """
+    Marca entries pendientes (cache_applied=False) como ya aplicados al cache
+    del usuario.
+    """
+    if not entry_ids:
+        return
+    db = get_db()
+    await db.ledger.update_many(
+        {"entry_id": {"$in": entry_ids}, "cache_applied": False},
+        {"$set": {"cache_applied": True}},
+    )
+
+
+async def list_unapplied_ledger_entries(before: datetime, limit: int) -> List[Dict[str, Any]]:
+    """
+    Entries escritos sin transacción cuyo cache no se confirmó y con más
+    antigüedad que `before` (índice parcial cache_pending), más viejos primero.
+    """
+    db = get_db()
+    cursor = (
+        db.ledger.find({"cache_applied": False, "created_at": {"$lte": before}})
+        .sort([("created_at", 1), ("_id", 1)])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+
 async def get_ledger_entry_by_entry_id(entry_id: str) -> Optional[Dict[str, Any]]:
     db = get_db()
     return await db.ledger.find_one({"entry_id": entry_id})
@@ -23,15 +64,30 @@ async def get_ledger_entry_by_entry_id(entry_id: str) -> Optional[Dict[str, Any]
 async def list_user_ledger_entries(
     telegram_id: int,
     limit: int = 50,
-    skip: int = 0,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
+    """
+    Historial del usuario, más reciente primero, paginado por keyset:
+    - after: cursor del último entry de la página actual (página siguiente, más viejos)
+    - before: cursor del primer entry de la página actual (página anterior, más nuevos)
+    Un cursor inválido se trata como primera página.
+    """
     db = get_db()
-    cursor = (
-        db.ledger.find({"telegram_id": telegram_id})
-        .sort("created_at", -1)
-        .skip(skip)
-        .limit(limit)
-    )
+    query: Dict[str, Any] = {"telegram_id": telegram_id}
+
+    pos = decode_cursor(before) if before else None
+    if pos:
+        query.update(keyset_filter(pos[0], pos[1], "$gt"))
+        cursor = db.ledger.find(query).sort([("created_at", 1), ("_id", 1)]).limit(limit)
+        rows = await cursor.to_list(length=limit)
+        rows.reverse()
+        return rows
+
+    pos = decode_cursor(after) if after else None
+    if pos:
+        query.update(keyset_filter(pos[0], pos[1], "$lt"))
+    cursor = db.ledger.find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit)
     return await cursor.to_list(length=limit)
 
 
@@ -3,6 +3,8 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
+from pymongo.errors import DuplicateKeyError
+
 from app.db.connection import get_db
 
 
@@ -11,9 +13,13 @@ async def create_month_snapshot_if_missing(
     top3: List[Dict[str, Any]],
     stats: Dict[str, Any],
     created_at: Optional[datetime] = None,
+    top: Optional[List[Dict[str, Any]]] = None,
+    histogram: Optional[Dict[str, Any]] = None,
 ) -> bool:
     """
     Crea un snapshot mensual si no existe.
+    - top: ranking completo del mes (top-N, ya ordenado y con position)
+    - histogram: buckets de puntos del mes ({edges, counts, total})
     Retorna True si lo creó, False si ya existía.
     """
     db = get_db()
@@ -28,11 +34,27 @@ async def create_month_snapshot_if_missing(
         "created_at": created_at,
         "top3": top3,
         "stats": stats,
+        "top": top or [],
+        "histogram": histogram,
     }
-    await db.month_snapshots.insert_one(doc)
+    try:
+        await db.month_snapshots.insert_one(doc)
+    except DuplicateKeyError:
+        # Otra instancia lo guardó entre el find y el insert (índice unique month_key)
+        return False
     return True
 
 
 async def get_month_snapshot(month_key: str) -> Optional[Dict[str, Any]]:
     db = get_db()
     return await db.month_snapshots.find_one({"month_key": month_key}, {"_id": 0})
+
+
+async def list_month_snapshot_keys(limit: int = 12) -> List[str]:
+    """
+    Últimos meses con snapshot (más reciente primero), sin traer el contenido.
+    """
+    db = get_db()
+    cursor = db.month_snapshots.find({}, {"_id": 0, "month_key": 1}).sort("month_key", -1).limit(limit)
+    rows = await cursor.to_list(length=limit)
+    return [r["month_key"] for r in rows if r.get("month_key")]
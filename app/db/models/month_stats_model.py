@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.db.connection import get_db
+
+
+def _reason_key(reason_code: str) -> str:
+    # Los reason_code van como nombre de campo: sin "." ni "$"
+    return (reason_code or "UNKNOWN").replace(".", "_").replace("$", "_")
+
+
+async def inc_month_stats(
+    month_key: str,
+    reason_code: str,
+    earned: int,
+    new_earner: bool,
+    user_month_score: int,
+    now: Optional[datetime] = None,
+) -> None:
+    """
+    Acumula las stats del mes (documento month_stats con _id = month_key)
+    en un solo upsert con $inc/$max, desde el write de puntos.
+    """
+    db = get_db()
+    now = now or datetime.utcnow()
+
+    inc: Dict[str, int] = {
+        "entries": 1,
+        f"entries_by_reason.{_reason_key(reason_code)}": 1,
+    }
+    if earned > 0:
+        inc["total_earned"] = earned
+    if new_earner:
+        inc["active_earners"] = 1
+
+    await db.month_stats.update_one(
+        {"_id": month_key},
+        {
+            "$inc": inc,
+            "$max": {"max_earned": int(user_month_score)},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"created_at": now},
+        },
+        upsert=True,
+    )
+
+
+async def get_month_stats(month_key: str) -> Optional[Dict[str, Any]]:
+    db = get_db()
+    return await db.month_stats.find_one({"_id": month_key})
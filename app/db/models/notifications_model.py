@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.db.connection import get_db
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+def new_notification(telegram_id: int, kind: str, text: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    return {
+        "telegram_id": telegram_id,
+        "kind": kind,
+        "text": text,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "last_error": None,
+        "created_at": now or datetime.utcnow(),
+        "sent_at": None,
+    }
+
+
+async def enqueue_notifications(docs: List[Dict[str, Any]]) -> int:
+    """
+    Encola mensajes para el job de envío (un solo insert_many).
+    """
+    if not docs:
+        return 0
+    db = get_db()
+    res = await db.notifications.insert_many(docs, ordered=False)
+    return len(res.inserted_ids)
+
+
+async def list_pending_notifications(limit: int) -> List[Dict[str, Any]]:
+    """
+    Pendientes en orden de llegada (índice parcial pending_created).
+    """
+    db = get_db()
+    cursor = (
+        db.notifications.find({"status": STATUS_PENDING})
+        .sort([("created_at", 1), ("_id", 1)])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+
+async def mark_notifications_sent(ids: List[Any], now: Optional[datetime] = None) -> None:
+    if not ids:
+        return
+    db = get_db()
+    await db.notifications.update_many(
+        {"_id": {"$in": ids}},
+        {"$set": {"status": STATUS_SENT, "sent_at": now or datetime.utcnow()}},
+    )
+
+
+async def mark_notification_failed(doc_id: Any, error: str, final: bool) -> None:
+    """
+    Registra un intento fallido. final=True lo saca de la cola (no se reintenta).
+    """
+    db = get_db()
+    update: Dict[str, Any] = {"$set": {"last_error": error[:300]}, "$inc": {"attempts": 1}}
+    if final:
+        update["$set"]["status"] = STATUS_FAILED
+    await db.notifications.update_one({"_id": doc_id}, update)
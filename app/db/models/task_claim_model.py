@@ -4,6 +4,7 @@ from typing import Any, Dict, List, Optional
 
 from bson import ObjectId
 from app.db.connection import get_db
+from app.db.pagination import decode_cursor, keyset_filter
 
 
 async def create_task_claim(doc: Dict[str, Any]) -> str:
@@ -39,14 +40,32 @@ async def find_user_claim_for_day(
     )
 
 
-async def list_pending_claims(limit: int = 50, skip: int = 0) -> List[Dict[str, Any]]:
+async def list_pending_claims(
+    limit: int = 50,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Pendientes en orden (created_at, _id) ascendente, paginados por keyset:
+    - after: cursor del último item de la página actual (página siguiente)
+    - before: cursor del primer item de la página actual (página anterior)
+    Un cursor inválido se trata como primera página.
+    """
     db = get_db()
-    cursor = (
-        db.task_claims.find({"status": "pending"})
-        .sort("created_at", 1)
-        .skip(skip)
-        .limit(limit)
-    )
+    query: Dict[str, Any] = {"status": "pending"}
+
+    pos = decode_cursor(before) if before else None
+    if pos:
+        query.update(keyset_filter(pos[0], pos[1], "$lt"))
+        cursor = db.task_claims.find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit)
+        rows = await cursor.to_list(length=limit)
+        rows.reverse()
+        return rows
+
+    pos = decode_cursor(after) if after else None
+    if pos:
+        query.update(keyset_filter(pos[0], pos[1], "$gt"))
+    cursor = db.task_claims.find(query).sort([("created_at", 1), ("_id", 1)]).limit(limit)
     return await cursor.to_list(length=limit)
 
 
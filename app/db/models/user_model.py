@@ -1,20 +1,20 @@
 from datetime import datetime
 from app.db.connection import get_db
+from app.db.request_context import get_user_doc, remember_user, update_user_doc
 
 
 async def get_user(telegram_id: int):
-    db = get_db()
-    return await db.users.find_one({"telegram_id": telegram_id})
+    return await get_user_doc(telegram_id)
 
 
 async def create_user(user_data: dict):
     db = get_db()
     await db.users.insert_one(user_data)
+    remember_user(user_data)
 
 
 async def update_user(telegram_id: int, update_data: dict):
-    db = get_db()
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
+    await update_user_doc(
+        telegram_id,
         {"$set": update_data}
     )
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(created_at: datetime, oid: ObjectId) -> str:
+    """
+    Cursor opaco (created_at, _id) -> 27 chars base64url.
+    8 bytes ms epoch + 12 bytes ObjectId: entra de sobra en callback_data (64 bytes).
+    """
+    ms = (created_at.replace(tzinfo=None) - _EPOCH) // timedelta(milliseconds=1)
+    raw = int(ms).to_bytes(8, "big", signed=True) + oid.binary
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, ObjectId]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        if len(raw) != 20:
+            return None
+        ms = int.from_bytes(raw[:8], "big", signed=True)
+        return _EPOCH + timedelta(milliseconds=ms), ObjectId(raw[8:])
+    except (binascii.Error, InvalidId, ValueError, OverflowError):
+        return None
+
+
+def doc_cursor(doc: Dict[str, Any]) -> str:
+    return encode_cursor(doc["created_at"], doc["_id"])
+
+
+def keyset_filter(created_at: datetime, oid: ObjectId, op: str) -> Dict[str, Any]:
+    """
+    Filtro keyset sobre (created_at, _id). op: "$gt" (después) o "$lt" (antes).
+    """
+    return {
+        "$or": [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "_id": {op: oid}},
+        ]
+    }
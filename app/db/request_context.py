@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Union
+
+from pymongo import ReturnDocument, monitoring
+
+from app.db.connection import get_db
+
+
+class RequestContext:
+    """
+    Estado por update de Telegram:
+    - user: documento completo del usuario que originó el update (cargado una vez)
+    - round_trips: cuántos comandos Mongo se ejecutaron durante el update
+    """
+
+    def __init__(self, telegram_id: int):
+        self.telegram_id = telegram_id
+        self.user: Optional[Dict[str, Any]] = None
+        self.loaded = False
+        self.round_trips = 0
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def current_context() -> Optional[RequestContext]:
+    return _current.get()
+
+
+def open_context(telegram_id: int):
+    return _current.set(RequestContext(telegram_id))
+
+
+def close_context(token) -> None:
+    _current.reset(token)
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """
+    Cuenta comandos Mongo en el RequestContext activo.
+    Motor corre pymongo en un executor copiando el contextvars.Context,
+    así que aquí vemos el mismo RequestContext que el handler.
+    """
+
+    def started(self, event) -> None:
+        ctx = _current.get()
+        if ctx is not None:
+            ctx.round_trips += 1
+
+    def succeeded(self, event) -> None:
+        pass
+
+    def failed(self, event) -> None:
+        pass
+
+
+async def load_context_user() -> Optional[Dict[str, Any]]:
+    """
+    Carga (una sola vez) el documento del usuario del update actual.
+    """
+    ctx = _current.get()
+    if ctx is None:
+        return None
+    if not ctx.loaded:
+        db = get_db()
+        ctx.user = await db.users.find_one({"telegram_id": ctx.telegram_id})
+        ctx.loaded = True
+    return ctx.user
+
+
+async def get_user_doc(
+    telegram_id: int,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Lee un usuario. Si es el usuario del update actual, sale del cache del request
+    (cero round trips); si no, va a Mongo con la proyección pedida.
+    El documento cacheado es completo, o sea un superset de cualquier proyección.
+    """
+    ctx = _current.get()
+    if ctx is not None and ctx.telegram_id == telegram_id:
+        return await load_context_user()
+
+    db = get_db()
+    return await db.users.find_one({"telegram_id": telegram_id}, projection)
+
+
+async def update_user_doc(
+    telegram_id: int,
+    update: Union[Dict[str, Any], List[Dict[str, Any]]],
+    upsert: bool = False,
+    session=None,
+    projection: Optional[Dict[str, Any]] = None,
+    filter_extra: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Write-through: si el usuario es el del update actual, escribe con
+    find_one_and_update (mismo round trip) y refresca el cache con el documento
+    resultante. Para otros usuarios hace un update_one normal, o un
+    find_one_and_update con `projection` si el llamador necesita el resultado.
+    `filter_extra` agrega condiciones al filtro (update condicional): si no
+    matchea, no se escribe nada, se retorna None y el cache queda como estaba.
+    Dentro de una transacción el documento aún no está confirmado: el cache se
+    invalida y el llamador lo repone con remember_user() tras el commit (si la
+    transacción aborta, la próxima lectura vuelve a Mongo).
+
+    Retorna el documento actualizado si lo tenemos, si no None.
+    """
+    db = get_db()
+    ctx = _current.get()
+    flt = {"telegram_id": telegram_id, **(filter_extra or {})}
+
+    if ctx is not None and ctx.telegram_id == telegram_id:
+        doc = await db.users.find_one_and_update(
+            flt,
+            update,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if doc is None and filter_extra:
+            return None
+        if session is not None and session.in_transaction:
+            ctx.user = None
+            ctx.loaded = False
+            return doc
+        ctx.user = doc
+        ctx.loaded = True
+        return doc
+
+    if projection is not None:
+        return await db.users.find_one_and_update(
+            flt,
+            update,
+            projection=projection,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+
+    await db.users.update_one(flt, update, upsert=upsert, session=session)
+    return None
+
+
+def remember_user(doc: Dict[str, Any]) -> None:
+    """
+    Guarda en el cache del request un documento completo recién creado (ej: /start)
+    o confirmado por una transacción.
+    """
+    ctx = _current.get()
+    if ctx is not None and ctx.telegram_id == doc.get("telegram_id"):
+        ctx.user = doc
+        ctx.loaded = True
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from app.db.connection import get_db
+from app.services.env import get_int_env
+
+logger = logging.getLogger(__name__)
+
+STATE_BANNED = "banned"
+STATE_BLOCKED = "blocked"
+
+# Estado en memoria de quienes NO pueden usar el bot (se consulta sin ir a Mongo):
+# - baneados: para siempre
+# - bloqueados: hasta blocked_until (None = sin fecha, hasta que un admin/barrido lo levante)
+_banned: Set[int] = set()
+_blocked: Dict[int, Optional[datetime]] = {}
+
+# Cambios que llegan durante un sync: se aplican sobre el resultado al terminar
+_syncing = False
+_pending: Dict[int, Tuple[str, Optional[datetime]]] = {}
+
+
+def access_gate_resync_seconds() -> int:
+    return max(10, get_int_env("ACCESS_GATE_RESYNC_SECONDS", 60))
+
+
+def _apply(banned: Set[int], blocked: Dict[int, Optional[datetime]], tid: int, state: str, until: Optional[datetime]) -> None:
+    banned.discard(tid)
+    blocked.pop(tid, None)
+    if state == STATE_BANNED:
+        banned.add(tid)
+    elif state == STATE_BLOCKED:
+        blocked[tid] = until
+
+
+def _note(tid: int, state: str, until: Optional[datetime] = None) -> None:
+    _apply(_banned, _blocked, tid, state, until)
+    if _syncing:
+        _pending[tid] = (state, until)
+
+
+def mark_banned(telegram_id: int) -> None:
+    _note(telegram_id, STATE_BANNED)
+
+
+def mark_blocked(telegram_id: int, blocked_until: Optional[datetime]) -> None:
+    _note(telegram_id, STATE_BLOCKED, blocked_until)
+
+
+def mark_active(telegram_id: int) -> None:
+    _note(telegram_id, "active")
+
+
+def gate_state(telegram_id: int, now: Optional[datetime] = None) -> Tuple[Optional[str], Optional[datetime]]:
+    """
+    (estado, blocked_until) si el usuario no puede usar el bot, si no (None, None).
+    Un bloqueo ya vencido deja pasar aunque el barrido aún no lo haya levantado.
+    """
+    if telegram_id in _banned:
+        return STATE_BANNED, None
+    if telegram_id in _blocked:
+        until = _blocked[telegram_id]
+        if until is None or until > (now or datetime.utcnow()):
+            return STATE_BLOCKED, until
+    return None, None
+
+
+async def sync_access_gate() -> None:
+    """
+    (Re)carga baneados y bloqueados desde users (índice status_state) y reemplaza
+    el estado de una vez. Recoge cambios hechos por otras instancias.
+    """
+    global _banned, _blocked, _syncing
+
+    db = get_db()
+    _syncing = True
+    _pending.clear()
+    try:
+        banned: Set[int] = set()
+        blocked: Dict[int, Optional[datetime]] = {}
+        cursor = db.users.find(
+            {"status.state": {"$in": [STATE_BANNED, STATE_BLOCKED]}},
+            {"_id": 0, "telegram_id": 1, "status.state": 1, "status.blocked_until": 1},
+        ).batch_size(5000)
+        async for u in cursor:
+            status = u.get("status") or {}
+            _apply(banned, blocked, int(u["telegram_id"]), status.get("state"), status.get("blocked_until"))
+
+        for tid, (state, until) in _pending.items():
+            _apply(banned, blocked, tid, state, until)
+
+        _banned, _blocked = banned, blocked
+    finally:
+        _syncing = False
+        _pending.clear()
+
+    logger.info("Access gate synced: banned=%d blocked=%d", len(_banned), len(_blocked))
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.db.connection import get_db
+from app.db.models.notifications_model import enqueue_notifications, new_notification
+from app.services.access_gate import mark_active
+from app.services.lease_service import acquire_lease, release_lease, renew_lease
+from app.services.env import get_int_env
+
+logger = logging.getLogger(__name__)
+
+SWEEP_LEASE = "account_expiry"
+
+KIND_PLAN_EXPIRED = "plan_expired"
+KIND_BLOCK_LIFTED = "block_lifted"
+
+
+def account_sweep_seconds() -> int:
+    return max(10, get_int_env("ACCOUNT_SWEEP_SECONDS", 60))
+
+
+def _sweep_batch_size() -> int:
+    return max(50, get_int_env("ACCOUNT_SWEEP_BATCH_SIZE", 500))
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        doc = (doc or {}).get(part)
+    return doc
+
+
+def _plan_text(user: Dict[str, Any]) -> str:
+    plan = ((user.get("ascenso_plan") or {}).get("type")) or "—"
+    return (
+        f"⏳ Tu plan <b>{plan}</b> de Ascenso venció.\n\n"
+        "Puedes canjear tus puntos por un nuevo plan desde el menú 🛒 Canjear."
+    )
+
+
+def _block_text(user: Dict[str, Any]) -> str:
+    return "✅ Tu bloqueo temporal terminó. Ya puedes volver a sumar puntos."
+
+
+# Cada barrido: campo de vencimiento, filtro de candidatos (usa índice parcial),
+# cambios a aplicar y marca para saber a quién se aplicó (la verdad es el write).
+_SWEEPS: List[Dict[str, Any]] = [
+    {
+        "kind": KIND_PLAN_EXPIRED,
+        "field": "ascenso_plan.expires_at",
+        # Un baneado no recibe cambios de plan ni avisos
+        "match": {"status.state": {"$ne": "banned"}},
+        "set": {"ascenso_plan.type": "FREE", "ascenso_plan.expires_at": None},
+        "mark": "ascenso_plan.expired_at",
+        "projection": {"_id": 0, "telegram_id": 1, "ascenso_plan": 1},
+        "text": _plan_text,
+    },
+    {
+        "kind": KIND_BLOCK_LIFTED,
+        "field": "status.blocked_until",
+        "match": {"status.state": "blocked"},
+        "set": {"status.state": "active", "status.blocked_until": None},
+        "mark": "status.unblocked_at",
+        "projection": {"_id": 0, "telegram_id": 1, "status": 1},
+        "text": _block_text,
+    },
+]
+
+
+async def _sweep(spec: Dict[str, Any], now: datetime, fence_token: Optional[int]) -> int:
+    """
+    Un tipo de vencimiento, en lotes:
+    1) candidatos vencidos por índice (más viejos primero)
+    2) bulk_write sin orden; el filtro exige que el vencimiento siga igual
+       (si un canje/admin lo cambió entre la lectura y el write, no aplica)
+    3) quienes quedaron con la marca = now son los afectados: se les encola aviso
+    """
+    db = get_db()
+    field = spec["field"]
+    batch_size = _sweep_batch_size()
+    total = 0
+
+    while True:
+        query = {**spec["match"], field: {"$type": "date", "$lte": now}}
+        rows: List[Dict[str, Any]] = await (
+            db.users.find(query, spec["projection"])
+            .sort(field, 1)
+            .limit(batch_size)
+            .to_list(length=batch_size)
+        )
+        if not rows:
+            break
+
+        ops = [
+            UpdateOne(
+                {**spec["match"], "telegram_id": u["telegram_id"], field: _get_path(u, field)},
+                {"$set": {**spec["set"], spec["mark"]: now}},
+            )
+            for u in rows
+        ]
+
+        res = await db.users.bulk_write(ops, ordered=False)
+        modified = res.modified_count
+        total += modified
+
+        if modified:
+            ids = [u["telegram_id"] for u in rows]
+            applied = await db.users.distinct("telegram_id", {"telegram_id": {"$in": ids}, spec["mark"]: now})
+            applied_set = set(applied)
+            if spec["kind"] == KIND_BLOCK_LIFTED:
+                for tid in applied_set:
+                    mark_active(tid)
+            await enqueue_notifications(
+                [
+                    new_notification(u["telegram_id"], spec["kind"], spec["text"](u), now)
+                    for u in rows
+                    if u["telegram_id"] in applied_set
+                ]
+            )
+
+        if fence_token is not None:
+            await renew_lease(SWEEP_LEASE, fence_token, account_sweep_seconds() * 5)
+        # Si nada cambió (todos renovados en paralelo), cortar: los retoma el próximo tick
+        if len(rows) < batch_size or modified == 0:
+            break
+
+    return total
+
+
+async def sweep_expired_accounts(fence_token: Optional[int] = None) -> Dict[str, int]:
+    """
+    Planes de Ascenso vencidos → FREE y bloqueos temporales vencidos → active.
+    Retorna {kind: usuarios modificados}.
+    """
+    now = datetime.utcnow()
+    result: Dict[str, int] = {}
+    for spec in _SWEEPS:
+        result[spec["kind"]] = await _sweep(spec, now, fence_token)
+
+    if any(result.values()):
+        logger.info("Account sweep: %s", result)
+    return result
+
+
+async def run_account_expiry_job() -> None:
+    """
+    Tick del scheduler: una sola instancia barre a la vez (lease).
+    """
+    token = await acquire_lease(SWEEP_LEASE, account_sweep_seconds() * 5)
+    if token is None:
+        return
+    try:
+        await sweep_expired_accounts(fence_token=token)
+    finally:
+        await release_lease(SWEEP_LEASE, token)
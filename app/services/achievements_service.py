@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict
+
+from pymongo import UpdateOne
+
+from app.db.connection import get_db
+
+# Logros de una sola vez en la vida: users.achievements es un set de códigos.
+# Otorgar = condición dentro del mismo update que paga la recompensa
+# (el código aún no está en el set), sin leer el ledger.
+ACH_FIRST_REDEEM = "FIRST_REDEEM"
+
+
+def not_granted_expr(code: str) -> Dict[str, Any]:
+    """
+    Expresión para pipelines de update: true si el usuario aún no tiene `code`.
+    """
+    return {"$eq": [{"$in": [code, {"$ifNull": ["$achievements", []]}]}, False]}
+
+
+def grant_expr(code: str) -> Dict[str, Any]:
+    """
+    Valor nuevo de achievements dentro de un pipeline ($addToSet equivalente,
+    conserva el orden de otorgamiento).
+    """
+    current = {"$ifNull": ["$achievements", []]}
+    return {"$cond": [not_granted_expr(code), {"$concatArrays": [current, [code]]}, current]}
+
+
+async def backfill_achievements() -> None:
+    """
+    Migración única: usuarios que ya recibieron el bonus de primer canje
+    (entry BONUS_FIRST_REDEEM en el ledger) reciben FIRST_REDEEM.
+    Marcada en system_state para no repetirse.
+    """
+    db = get_db()
+    flag = "migration:achievements"
+    if await db.system_state.find_one({"_id": flag}, {"_id": 1}):
+        return
+
+    rows = await db.ledger.aggregate(
+        [
+            {"$match": {"reason_code": "BONUS_FIRST_REDEEM"}},
+            {"$group": {"_id": "$telegram_id"}},
+        ]
+    ).to_list(length=None)
+
+    ops = [
+        UpdateOne({"telegram_id": row["_id"]}, {"$addToSet": {"achievements": ACH_FIRST_REDEEM}})
+        for row in rows
+    ]
+    modified = 0
+    for i in range(0, len(ops), 500):
+        res = await db.users.bulk_write(ops[i:i + 500], ordered=False)
+        modified += res.modified_count
+
+    await db.system_state.update_one(
+        {"_id": flag},
+        {"$set": {"done_at": datetime.utcnow(), "users": modified}},
+        upsert=True,
+    )
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, List, Tuple
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.db.models.ledger_model import list_user_ledger_entries
+from app.db.models.month_stats_model import get_month_stats
 from app.db.models.task_claim_model import (
     list_pending_claims,
     find_task_claim_by_id,
     update_claim_status,
 )
 from app.services.ledger_service import create_points_entry, TYPE_EARN, CAT_TASK
-from app.services.tiers_service import get_multiplier, ensure_auto_tier_by_month_points, refresh_tiers
+from app.services.periods import month_key_utc
+from app.services.tiers_service import get_multiplier, ensure_auto_tier_by_month_points
 
 TASK_SHARE = "TASK_SHARE_POST"
 
@@ -34,8 +38,49 @@ def is_admin(telegram_id: int) -> bool:
     return telegram_id in _parse_admin_ids()
 
 
-async def get_pending_claims(limit: int = 10, skip: int = 0) -> List[Dict[str, Any]]:
-    return await list_pending_claims(limit=limit, skip=skip)
+async def get_pending_claims(
+    limit: int = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return await list_pending_claims(limit=limit, after=after, before=before)
+
+
+async def get_user_ledger_entries(
+    telegram_id: int,
+    limit: int = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return await list_user_ledger_entries(telegram_id, limit=limit, after=after, before=before)
+
+
+async def build_month_stats_text(month_key: Optional[str] = None) -> str:
+    """
+    Stats vivas del mes desde month_stats (un find por _id, sin agregaciones).
+    """
+    mk = month_key or month_key_utc(datetime.utcnow())
+    stats = await get_month_stats(mk) or {}
+
+    lines = [
+        "📊 <b>Stats del Mes</b>",
+        f"🗓️ Mes: <b>{mk}</b>\n",
+        f"⭐ Puntos ganados: <b>{int(stats.get('total_earned') or 0)}</b>",
+        f"👥 Usuarios que ganaron puntos: <b>{int(stats.get('active_earners') or 0)}</b>",
+        f"🥇 Máximo de un usuario: <b>{int(stats.get('max_earned') or 0)}</b>",
+        f"🧾 Movimientos: <b>{int(stats.get('entries') or 0)}</b>",
+    ]
+
+    by_reason: Dict[str, int] = stats.get("entries_by_reason") or {}
+    if by_reason:
+        lines.append("\n<b>Por motivo</b>")
+        for reason, count in sorted(by_reason.items(), key=lambda kv: -kv[1]):
+            lines.append(f"• <code>{reason}</code>: {count}")
+
+    updated_at = stats.get("updated_at")
+    if updated_at:
+        lines.append(f"\n🕒 Actualizado: {updated_at.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+    return "\n".join(lines)
 
 
 def _apply_multiplier(base_points: int, mult: float) -> int:
@@ -64,7 +109,6 @@ async def approve_share_claim(claim_id: str, admin_id: int) -> Tuple[bool, str]:
     if not ok:
         return False, "No se pudo aprobar (quizás ya fue aprobado por otro admin)."
 
-    await refresh_tiers(telegram_id)
     mult = await get_multiplier(telegram_id)
     pts = _apply_multiplier(base_points, mult)
 
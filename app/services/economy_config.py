@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from app.db.connection import get_db
+from app.services.env import get_int_env
+
+logger = logging.getLogger(__name__)
+
+CONFIG_ID = "economy"
+
+
+@dataclass(frozen=True)
+class EconomyConfig:
+    """
+    Parámetros de la economía de puntos. Inmutable: un cambio crea un objeto
+    nuevo y se reemplaza la referencia global (los lectores nunca ven mezclas).
+    """
+
+    version: int = 0
+    # Tareas
+    pts_checkin: int = 2
+    pts_lesson_quiz: int = 3
+    pts_share_post: int = 6
+    # Canjes
+    cost_plus: int = 250
+    cost_premium: int = 400
+    plan_days: int = 30
+    bonus_first_points: int = 20
+    # Tiers
+    elite_mult: float = 1.2
+    titan_mult: float = 1.5
+    elite_threshold: int = 200
+    titan_threshold: int = 400
+    tier_days: int = 30
+    titan_premium_redeems: int = 3
+    # Seguridad
+    penalty_first_points: int = 50
+    block_days: int = 7
+
+
+# Mínimos por campo (mismos que aplicaban los helpers de env)
+_FIELD_MIN: Dict[str, float] = {
+    "pts_checkin": 0,
+    "pts_lesson_quiz": 0,
+    "pts_share_post": 0,
+    "cost_plus": 1,
+    "cost_premium": 1,
+    "plan_days": 1,
+    "bonus_first_points": 0,
+    "elite_mult": 1.0,
+    "titan_mult": 1.0,
+    "elite_threshold": 1,
+    "titan_threshold": 1,
+    "tier_days": 1,
+    "titan_premium_redeems": 1,
+    "penalty_first_points": 1,
+    "block_days": 1,
+}
+
+# Variables de entorno históricas: siguen sirviendo de base al arrancar
+_ENV_KEYS: Dict[str, str] = {
+    "elite_mult": "ELITE_MULT",
+    "titan_mult": "TITAN_MULT",
+    "elite_threshold": "ELITE_THRESHOLD",
+    "titan_threshold": "TITAN_THRESHOLD",
+    "tier_days": "TIER_DAYS",
+    "titan_premium_redeems": "TITAN_PREMIUM_REDEEMS",
+    "penalty_first_points": "PENALTY_FIRST_POINTS",
+    "block_days": "BLOCK_DAYS",
+}
+
+_FIELD_TYPES: Dict[str, type] = {
+    f.name: type(f.default) for f in dataclasses.fields(EconomyConfig) if f.name != "version"
+}
+
+
+def editable_keys() -> Tuple[str, ...]:
+    return tuple(_FIELD_TYPES)
+
+
+def coerce_value(key: str, raw: Any) -> Any:
+    """
+    Convierte y valida un valor para `key`. Lanza ValueError si no aplica.
+    """
+    if key not in _FIELD_TYPES:
+        raise ValueError(f"Clave desconocida: {key}")
+    value = _FIELD_TYPES[key](str(raw).strip()) if isinstance(raw, str) else _FIELD_TYPES[key](raw)
+    if value < _FIELD_MIN.get(key, 0):
+        raise ValueError(f"{key} debe ser >= {_FIELD_MIN.get(key, 0)}")
+    return value
+
+
+def _merge(base: EconomyConfig, values: Dict[str, Any], version: int) -> EconomyConfig:
+    clean: Dict[str, Any] = {}
+    for key, raw in (values or {}).items():
+        try:
+            clean[key] = coerce_value(key, raw)
+        except (TypeError, ValueError):
+            logger.warning("Economy config: ignoring invalid %s=%r", key, raw)
+    return dataclasses.replace(base, version=version, **clean)
+
+
+def _from_env() -> EconomyConfig:
+    """
+    Base desde las variables de entorno, con la misma semántica que tenían los
+    helpers de env: valor no parseable => default; valor bajo el mínimo =>
+    se lleva al mínimo (ej: ELITE_MULT=0.8 => 1.0), con un warning.
+    """
+    values: Dict[str, Any] = {}
+    for key, env in _ENV_KEYS.items():
+        raw = os.getenv(env)
+        if raw is None or not raw.strip():
+            continue
+        try:
+            value = _FIELD_TYPES[key](raw.strip())
+        except (TypeError, ValueError):
+            logger.warning("Economy config: %s=%r is not a number, using default", env, raw)
+            continue
+        floor = _FIELD_TYPES[key](_FIELD_MIN.get(key, 0))
+        if value < floor:
+            logger.warning("Economy config: %s=%r below minimum, clamped to %s", env, raw, floor)
+            value = floor
+        values[key] = value
+    return _merge(EconomyConfig(), values, version=0)
+
+
+# Base de env: se lee en load_economy_config (después de load_dotenv), una sola vez
+_env_base: Optional[EconomyConfig] = None
+_config: EconomyConfig = EconomyConfig()
+
+
+def get_config() -> EconomyConfig:
+    """
+    Config vigente. Solo una lectura de variable global (sin env, sin I/O).
+    """
+    return _config
+
+
+def config_check_seconds() -> int:
+    return max(5, get_int_env("ECONOMY_CONFIG_CHECK_SECONDS", 15))
+
+
+async def load_economy_config() -> EconomyConfig:
+    """
+    Carga la config desde Mongo (config._id = "economy") sobre la base de env.
+    """
+    global _config, _env_base
+
+    if _env_base is None:
+        _env_base = _from_env()
+
+    db = get_db()
+    doc = await db.config.find_one({"_id": CONFIG_ID})
+    if not doc:
+        _config = _env_base
+    else:
+        _config = _merge(_env_base, doc.get("values") or {}, int(doc.get("version") or 0))
+    return _config
+
+
+async def check_economy_config_version() -> None:
+    """
+    Tick del scheduler: lee solo `version`; si cambió (otra instancia o un admin),
+    recarga el documento completo.
+    """
+    db = get_db()
+    doc = await db.config.find_one({"_id": CONFIG_ID}, {"version": 1})
+    version = int((doc or {}).get("version") or 0)
+    if version != _config.version:
+        cfg = await load_economy_config()
+        logger.info("Economy config reloaded: version=%d", cfg.version)
+
+
+async def set_economy_value(key: str, raw: Any, admin_id: int) -> Tuple[bool, str]:
+    """
+    Cambia un parámetro en runtime: persiste en Mongo, sube la versión y recarga
+    en esta instancia (las demás lo ven en su próximo chequeo de versión).
+    """
+    try:
+        value = coerce_value(key, raw)
+    except (TypeError, ValueError) as e:
+        return False, str(e)
+
+    db = get_db()
+    await db.config.update_one(
+        {"_id": CONFIG_ID},
+        {
+            "$set": {
+                f"values.{key}": value,
+                "updated_at": datetime.utcnow(),
+                "updated_by": admin_id,
+            },
+            "$inc": {"version": 1},
+        },
+        upsert=True,
+    )
+    cfg = await load_economy_config()
+    return True, f"✅ {key} = {getattr(cfg, key)} (versión {cfg.version})"
+
+
+def describe_config(cfg: Optional[EconomyConfig] = None) -> str:
+    cfg = cfg or _config
+    lines = [f"⚙️ <b>Economía</b> (versión {cfg.version})\n"]
+    for key in editable_keys():
+        lines.append(f"• <code>{key}</code> = <b>{getattr(cfg, key)}</b>")
+    lines.append("\nCambiar: <code>/econ_set clave valor</code>")
+    return "\n".join(lines)
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import os
+
+
+# Lectores de variables de entorno para parámetros operativos (intervalos de
+# jobs, tamaños de lote). Valor ausente o inválido => default; cada llamador
+# aplica su propio mínimo/máximo. Pensados para leerse al arrancar o en jobs,
+# no en el camino de cada update.
+def get_int_env(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)).strip())
+    except Exception:
+        return default
+
+
+def get_float_env(key: str, default: float) -> float:
+    try:
+        return float(os.getenv(key, str(default)).strip())
+    except Exception:
+        return default
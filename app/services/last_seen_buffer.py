@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+from app.db.connection import get_db
+from app.services.env import get_int_env
+
+logger = logging.getLogger(__name__)
+
+# telegram_id -> último toque visto desde el último flush (varios toques = una entrada)
+_pending: Dict[int, datetime] = {}
+
+FLUSH_CHUNK = 1000
+
+
+def last_seen_flush_seconds() -> int:
+    return max(1, get_int_env("LAST_SEEN_FLUSH_SECONDS", 5))
+
+
+def touch(telegram_id: int, now: Optional[datetime] = None) -> None:
+    """
+    Registra actividad del usuario en memoria (sin I/O). Se escribe en el próximo flush.
+    """
+    now = now or datetime.utcnow()
+    prev = _pending.get(telegram_id)
+    if prev is None or now > prev:
+        _pending[telegram_id] = now
+
+
+def pending_count() -> int:
+    return len(_pending)
+
+
+async def flush_last_seen() -> int:
+    """
+    Escribe los toques acumulados con bulk_write sin orden ($max: nunca retrocede
+    la fecha si otra instancia escribió una más nueva; sin upsert: no crea usuarios).
+    Si falla, los toques vuelven al buffer para el próximo flush.
+    Retorna cuántos usuarios escribió.
+    """
+    global _pending
+
+    if not _pending:
+        return 0
+    batch, _pending = _pending, {}
+
+    db = get_db()
+    items = list(batch.items())
+    written = 0
+    for i in range(0, len(items), FLUSH_CHUNK):
+        chunk = items[i:i + FLUSH_CHUNK]
+        ops = [UpdateOne({"telegram_id": tid}, {"$max": {"last_seen_at": ts}}) for tid, ts in chunk]
+        try:
+            await db.users.bulk_write(ops, ordered=False)
+            written += len(chunk)
+        except Exception:
+            logger.exception("last_seen flush failed: %d users re-queued", len(items) - i)
+            for tid, ts in items[i:]:
+                touch(tid, ts)
+            break
+
+    logger.debug("last_seen flushed: users=%d", written)
+    return written
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from app.db.connection import get_db
+from app.services.env import get_int_env
+from app.services.periods import month_key_utc, week_key_utc
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreIndex:
+    """
+    Índice de orden para el ranking: orden (puntaje desc, telegram_id asc).
+    - Fenwick tree (BIT) sobre puntajes => contar "cuántos tienen más que X" en O(log M)
+    - buckets por puntaje con telegram_ids en un SortedList => desempate estable,
+      alta/baja/posición/k-ésimo dentro del bucket en O(log B) aunque el bucket
+      sea enorme (ej: miles de usuarios con el mismo puntaje bajo)
+    Responde posición, k-ésimo, top N y vecinos en tiempo logarítmico
+    (M = puntaje máximo; el árbol crece duplicando capacidad).
+    Solo guarda puntajes > 0.
+    """
+
+    def __init__(self) -> None:
+        self._scores: Dict[int, int] = {}
+        self._buckets: Dict[int, SortedList] = {}
+        self._cap = 1024  # potencia de 2 (necesario para el descenso binario de kth)
+        self._tree = [0] * (self._cap + 1)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    # ---- Fenwick ----
+    def _add(self, score: int, delta: int) -> None:
+        i = score + 1
+        while i <= self._cap:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, score: int) -> int:
+        # cantidad de usuarios con puntaje <= score
+        i = min(score + 1, self._cap)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _grow(self, score: int) -> None:
+        cap = self._cap
+        while cap < score + 1:
+            cap *= 2
+        self._cap = cap
+        self._tree = [0] * (cap + 1)
+        for s, ids in self._buckets.items():
+            self._add(s, len(ids))
+
+    # ---- escritura ----
+    def set_score(self, telegram_id: int, score: int) -> None:
+        score = int(score)
+        old = self._scores.get(telegram_id)
+        if old == score:
+            return
+        if old is not None:
+            bucket = self._buckets[old]
+            bucket.remove(telegram_id)
+            if not bucket:
+                del self._buckets[old]
+            self._add(old, -1)
+            del self._scores[telegram_id]
+        if score <= 0:
+            return
+        if score + 1 > self._cap:
+            self._grow(score)
+        self._scores[telegram_id] = score
+        bucket = self._buckets.get(score)
+        if bucket is None:
+            bucket = self._buckets[score] = SortedList()
+        bucket.add(telegram_id)
+        self._add(score, 1)
+
+    def remove(self, telegram_id: int) -> None:
+        self.set_score(telegram_id, 0)
+
+    # ---- lectura ----
+    def score_of(self, telegram_id: int) -> int:
+        return self._scores.get(telegram_id, 0)
+
+    def count_above(self, score: int) -> int:
+        return len(self._scores) - self._prefix(score)
+
+    def position(self, telegram_id: int) -> Optional[int]:
+        """
+        Posición 1-based, o None si no tiene puntos.
+        """
+        score = self._scores.get(telegram_id)
+        if score is None:
+            return None
+        return self.count_above(score) + self._buckets[score].bisect_left(telegram_id) + 1
+
+    def kth(self, k: int) -> Optional[Tuple[int, int]]:
+        """
+        (telegram_id, score) en la posición k (1-based), o None si no existe.
+        """
+        total = len(self._scores)
+        if k < 1 or k > total:
+            return None
+
+        # Menor puntaje s con prefix(s) >= total - k + 1 (descenso binario en el BIT)
+        target = total - k + 1
+        pos = 0
+        step = self._cap
+        while step:
+            nxt = pos + step
+            if nxt <= self._cap and self._tree[nxt] < target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step //= 2
+        score = pos  # índice BIT pos+1 <=> puntaje pos
+
+        offset = k - self.count_above(score) - 1
+        return self._buckets[score][offset], score
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        out = []
+        for k in range(1, min(n, len(self._scores)) + 1):
+            out.append(self.kth(k))
+        return out
+
+    def around(self, telegram_id: int, k: int) -> List[Tuple[int, int, int]]:
+        """
+        Hasta k usuarios arriba y k abajo del usuario (incluido):
+        lista de (posición, telegram_id, score).
+        """
+        pos = self.position(telegram_id)
+        if pos is None:
+            return []
+        out = []
+        for p in range(max(1, pos - k), min(len(self._scores), pos + k) + 1):
+            tid, score = self.kth(p)
+            out.append((p, tid, score))
+        return out
+
+
+def leaderboard_resync_seconds() -> int:
+    return max(30, get_int_env("LEADERBOARD_RESYNC_SECONDS", 300))
+
+
+# Tableros indexados en memoria (process-local): campo de puntaje en users.rank
+# y campo de periodo (None = histórico, sin periodo). Otras instancias escriben
+# también: el resync periódico contra Mongo corrige la deriva.
+BOARD_MONTH = "month"
+BOARD_WEEK = "week"
+BOARD_ALL = "all"
+
+_BOARDS: Dict[str, Dict[str, Optional[str]]] = {
+    BOARD_MONTH: {"score_field": "earned_this_month", "key_field": "month_key"},
+    BOARD_WEEK: {"score_field": "earned_this_week", "key_field": "week_key"},
+    BOARD_ALL: {"score_field": "earned_all_time", "key_field": None},
+}
+
+# board -> índice / periodo del índice (None hasta el primer sync)
+_indexes: Dict[str, ScoreIndex] = {board: ScoreIndex() for board in _BOARDS}
+_index_keys: Dict[str, Optional[str]] = {board: None for board in _BOARDS}
+_synced: Dict[str, bool] = {board: False for board in _BOARDS}
+_syncing = False
+# writes durante el sync: board -> {telegram_id: (periodo, puntaje)}
+_pending: Dict[str, Dict[int, Tuple[Optional[str], int]]] = {board: {} for board in _BOARDS}
+
+
+def _board_key(board: str, now: datetime) -> Optional[str]:
+    if board == BOARD_MONTH:
+        return month_key_utc(now)
+    if board == BOARD_WEEK:
+        return week_key_utc(now)
+    return None
+
+
+def get_board_index(board: str, key: Optional[str]) -> Optional[ScoreIndex]:
+    """
+    Índice listo para el tablero `board` en el periodo `key` (None en el
+    histórico), o None (aún no sincronizado: usar Mongo).
+    """
+    if _synced[board] and _index_keys[board] == key:
+        return _indexes[board]
+    return None
+
+
+def get_month_index(month_key: str) -> Optional[ScoreIndex]:
+    return get_board_index(BOARD_MONTH, month_key)
+
+
+def _note_board_score(board: str, telegram_id: int, key: Optional[str], score: int) -> None:
+    if _BOARDS[board]["key_field"] and not key:
+        return
+    if _syncing:
+        _pending[board][telegram_id] = (key, score)
+    if not _synced[board]:
+        return
+    current = _index_keys[board]
+    if key is not None and current is not None and key > current:
+        # Cambió el periodo: todos arrancan en 0, un índice vacío es correcto
+        _indexes[board] = ScoreIndex()
+        _index_keys[board] = key
+    if key == _index_keys[board]:
+        _indexes[board].set_score(telegram_id, score)
+
+
+def note_rank(telegram_id: int, rank: Dict[str, Any]) -> None:
+    """
+    Actualización incremental desde el write de puntos: `rank` es users.rank
+    ya actualizado (puntajes nuevos de mes, semana e histórico).
+    """
+    for board, cfg in _BOARDS.items():
+        key = rank.get(cfg["key_field"]) if cfg["key_field"] else None
+        _note_board_score(board, telegram_id, key, int(rank.get(cfg["score_field"]) or 0))
+
+
+def remove_user(telegram_id: int) -> None:
+    for board in _BOARDS:
+        _indexes[board].remove(telegram_id)
+        _pending[board].pop(telegram_id, None)
+
+
+async def _load_board(board: str, key: Optional[str]) -> ScoreIndex:
+    db = get_db()
+    cfg = _BOARDS[board]
+    field = f"rank.{cfg['score_field']}"
+    q: Dict[str, Any] = {field: {"$gt": 0}, "status.state": {"$ne": "banned"}}
+    if cfg["key_field"]:
+        q[f"rank.{cfg['key_field']}"] = key
+
+    fresh = ScoreIndex()
+    cursor = db.users.find(q, {"_id": 0, "telegram_id": 1, field: 1}).batch_size(5000)
+    async for u in cursor:
+        fresh.set_score(int(u["telegram_id"]), int(((u.get("rank") or {}).get(cfg["score_field"])) or 0))
+    return fresh
+
+
+async def sync_leaderboard() -> None:
+    """
+    (Re)construye los índices (mes, semana, histórico) desde users y reemplaza
+    cada uno de una vez. Los writes que llegan mientras se lee quedan en
+    _pending y se aplican al final.
+    """
+    global _syncing
+
+    now = datetime.utcnow()
+
+    _syncing = True
+    for pending in _pending.values():
+        pending.clear()
+    try:
+        for board in _BOARDS:
+            key = _board_key(board, now)
+            fresh = await _load_board(board, key)
+            for tid, (p_key, score) in _pending[board].items():
+                if p_key == key:
+                    fresh.set_score(tid, score)
+            _indexes[board] = fresh
+            _index_keys[board] = key
+            _synced[board] = True
+    finally:
+        _syncing = False
+        for pending in _pending.values():
+            pending.clear()
+
+    logger.info(
+        "Leaderboard index synced: %s",
+        ", ".join(f"{board}={len(_indexes[board])}" for board in _BOARDS),
+    )
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+import secrets
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.db.connection import get_db
+
+# Identidad de esta instancia del bot (host:pid:random)
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+
+def _lease_id(name: str) -> str:
+    return f"lease:{name}"
+
+
+async def acquire_lease(name: str, ttl_seconds: int) -> Optional[int]:
+    """
+    Intenta tomar el lease `name` (documento en system_state).
+    Retorna el fencing token (monótono creciente) si lo consiguió, None si otra
+    instancia lo tiene vigente.
+
+    El token se usa para proteger las escrituras del trabajo: el recurso guarda el
+    último token visto y rechaza escrituras con token menor (ver fenced_filter).
+    """
+    db = get_db()
+    now = datetime.utcnow()
+    try:
+        doc = await db.system_state.find_one_and_update(
+            {"_id": _lease_id(name), "expires_at": {"$lte": now}},
+            {
+                "$set": {
+                    "holder": INSTANCE_ID,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=ttl_seconds),
+                },
+                "$inc": {"token": 1},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # El lease existe y no ha vencido (el upsert choca con el _id)
+        return None
+    return int(doc["token"])
+
+
+async def renew_lease(name: str, token: int, ttl_seconds: int) -> bool:
+    """
+    Extiende el lease si seguimos siendo el dueño con ese token.
+    """
+    db = get_db()
+    now = datetime.utcnow()
+    res = await db.system_state.update_one(
+        {"_id": _lease_id(name), "holder": INSTANCE_ID, "token": token},
+        {"$set": {"expires_at": now + timedelta(seconds=ttl_seconds)}},
+    )
+    return res.matched_count == 1
+
+
+async def release_lease(name: str, token: int) -> None:
+    db = get_db()
+    await db.system_state.update_one(
+        {"_id": _lease_id(name), "holder": INSTANCE_ID, "token": token},
+        {"$set": {"expires_at": datetime.utcnow()}},
+    )
+
+
+def fenced_filter(doc_id: str, token: int) -> dict:
+    """
+    Filtro para escrituras protegidas: solo aplica si nadie con un token
+    mayor escribió antes en el documento. Acompañar con $set fence_token=token.
+    """
+    return {
+        "_id": doc_id,
+        "$or": [{"fence_token": {"$exists": False}}, {"fence_token": {"$lte": token}}],
+    }
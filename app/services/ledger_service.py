@@ -1,11 +1,29 @@
 from __future__ import annotations
 
+import logging
 import secrets
-from datetime import datetime
-from typing import Any, Dict, Optional, Tuple
-
-from app.db.connection import get_db
-from app.db.models.ledger_model import create_ledger_entry, get_ledger_entry_by_entry_id
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.db.connection import get_client, supports_transactions
+from app.db.request_context import get_user_doc, remember_user, update_user_doc
+from app.db.models.ledger_model import (
+    create_ledger_entries,
+    create_ledger_entry,
+    list_unapplied_ledger_entries,
+    mark_ledger_cache_applied,
+)
+from app.db.models.month_stats_model import inc_month_stats
+from app.services.env import get_int_env
+from app.services.lease_service import acquire_lease, release_lease, renew_lease
+from app.services.ledger_writer import get_ledger_writer
+from app.services.leaderboard_index import note_rank
+from app.services.ranking_service import note_month_score
+from app.services.periods import month_key_utc, week_key_utc
+
+logger = logging.getLogger(__name__)
 
 
 # Tipos permitidos
@@ -23,8 +41,23 @@ CAT_SECURITY = "SECURITY"
 CAT_ADMIN = "ADMIN"
 
 
-def _month_key(dt: datetime) -> str:
-    return dt.strftime("%Y-%m")
+# Reintentos si el entry_id choca con el índice único ledger.entry_id
+ENTRY_ID_MAX_ATTEMPTS = 5
+
+# Sin transacción, el cache guarda los últimos entry_id aplicados: el
+# reconciliador no re-aplica un entry que ya llegó al cache (idempotente)
+APPLIED_IDS_KEEP = 50
+RECONCILE_LEASE = "ledger_reconcile"
+RECONCILE_BATCH = 200
+
+
+def ledger_reconcile_seconds() -> int:
+    return max(30, get_int_env("LEDGER_RECONCILE_SECONDS", 60))
+
+
+def _reconcile_grace_seconds() -> int:
+    # Un entry recién escrito está pendiente unos ms: solo se tocan los viejos
+    return max(10, get_int_env("LEDGER_RECONCILE_GRACE_SECONDS", 120))
 
 
 def _make_entry_id(dt: datetime) -> str:
@@ -34,6 +67,21 @@ def _make_entry_id(dt: datetime) -> str:
     return f"LED-{ymd}-{token}"
 
 
+def _is_entry_id_collision(e: DuplicateKeyError) -> bool:
+    details = e.details or {}
+    key = details.get("keyPattern") or details.get("keyValue") or {}
+    return "entry_id" in key or "entry_id" in str(e)
+
+
+def _is_batch_entry_id_collision(e: BulkWriteError) -> bool:
+    errors = (e.details or {}).get("writeErrors") or []
+    return bool(errors) and all(
+        err.get("code") == 11000
+        and "entry_id" in str(err.get("keyPattern") or err.get("keyValue") or err.get("errmsg"))
+        for err in errors
+    )
+
+
 def _compute_signed_and_month_earned(entry_type: str, points: int) -> Tuple[int, int]:
     """
     signed_points: afecta el balance total
@@ -54,100 +102,414 @@ def _compute_signed_and_month_earned(entry_type: str, points: int) -> Tuple[int,
     raise ValueError(f"Unknown entry_type: {entry_type}")
 
 
+def _ifnull(path: str, default: Any) -> Dict[str, Any]:
+    return {"$ifNull": [path, default]}
+
+
+def points_cache_fields(
+    earned: Union[int, Dict[str, Any], str],
+    spent: Union[int, Dict[str, Any], str],
+    ranked: Union[int, Dict[str, Any], str],
+    now: datetime,
+) -> Dict[str, Any]:
+    """
+    Campos del $set que mantiene el cache de puntos (sin leer antes):
+    - balance_cached / lifetime_* se suman sobre el valor actual
+    - rollover mensual "lazy": si rank.month_key no es el mes actual,
+      earned_this_month arranca de 0 antes de sumar (sin month_key = mes actual);
+      el mes que se cierra queda en rank.prev_month_key / earned_prev_month
+      para el snapshot del rollover global
+    - igual para la semana ISO (rank.week_key / earned_this_week)
+    - rank.earned_all_time acumula lo mismo que el mes (arranca de lifetime_earned)
+    - si el usuario no existía (upsert), completa los campos base.
+    earned/spent/ranked son enteros >= 0 o expresiones de agregación (ej: un bonus
+    condicional calculado en una etapa previa del mismo pipeline).
+    """
+    mk = month_key_utc(now)
+    same_month = {"$eq": [_ifnull("$rank.month_key", mk), mk]}
+    month_base = {"$cond": [same_month, _ifnull("$rank.earned_this_month", 0), 0]}
+    wk = week_key_utc(now)
+    same_week = {"$eq": [_ifnull("$rank.week_key", wk), wk]}
+    week_base = {"$cond": [same_week, _ifnull("$rank.earned_this_week", 0), 0]}
+    all_time_base = _ifnull("$rank.earned_all_time", _ifnull("$points.lifetime_earned", 0))
+    if isinstance(earned, int) and isinstance(spent, int):
+        signed: Any = earned - spent
+    else:
+        signed = {"$subtract": [earned, spent]}
+
+    return {
+        # Campos base: solo aplican si el usuario no existía (no deberíamos
+        # llegar aquí sin /start, pero por seguridad queda un doc válido).
+        "created_at": _ifnull("$created_at", now),
+        "policy": _ifnull("$policy", {"accepted": False, "accepted_at": None, "version": "1.0"}),
+        "status": _ifnull("$status", {"state": "active", "blocked_until": None, "ban_reason": None}),
+        "infractions": _ifnull("$infractions", {"count": 0, "last_at": None}),
+        "ascenso_plan": _ifnull("$ascenso_plan", {"type": "FREE", "expires_at": None}),
+        "elite": _ifnull("$elite", {"active": False, "active_until": None}),
+        "titan": _ifnull("$titan", {"active": False, "active_until": None, "premium_redeems_count": 0}),
+        # Histórico: se siembra con el lifetime_earned previo a este write
+        "rank.earned_all_time": {"$add": [all_time_base, ranked]},
+        # Cache de puntos
+        "points.balance_cached": {"$add": [_ifnull("$points.balance_cached", 0), signed]},
+        "points.lifetime_earned": {"$add": [_ifnull("$points.lifetime_earned", 0), earned]},
+        "points.lifetime_spent": {"$add": [_ifnull("$points.lifetime_spent", 0), spent]},
+        "points.updated_at": now,
+        "rank.prev_month_key": {"$cond": [same_month, _ifnull("$rank.prev_month_key", None), "$rank.month_key"]},
+        "rank.earned_prev_month": {
+            "$cond": [same_month, _ifnull("$rank.earned_prev_month", 0), _ifnull("$rank.earned_this_month", 0)]
+        },
+        # Contadores del mes/semana: todas las expresiones de un mismo $set leen
+        # el documento de entrada, así que el $cond compara contra la key vieja
+        "rank.earned_this_month": {"$add": [month_base, ranked]},
+        "rank.month_key": mk,
+        "rank.earned_this_week": {"$add": [week_base, ranked]},
+        "rank.week_key": wk,
+    }
+
+
+def _points_cache_pipeline(
+    signed_delta: int,
+    month_earned_delta: int,
+    now: datetime,
+    entry_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Update por pipeline (un solo round trip, sin leer antes) para un movimiento.
+    Con `entry_id` (writes sin transacción) lo agrega a points.applied_entry_ids.
+    """
+    fields = points_cache_fields(
+        earned=max(0, signed_delta),
+        spent=max(0, -signed_delta),
+        ranked=max(0, month_earned_delta),
+        now=now,
+    )
+    if entry_id is not None:
+        applied = {"$concatArrays": [_ifnull("$points.applied_entry_ids", []), [entry_id]]}
+        fields["points.applied_entry_ids"] = {"$slice": [applied, -APPLIED_IDS_KEEP]}
+    return [{"$set": fields}]
+
+
+_CACHE_PROJECTION = {"telegram_id": 1, "rank": 1, "points": 1, "status.state": 1}
+
+
 async def _update_user_points_cache(
     telegram_id: int,
     signed_delta: int,
     month_earned_delta: int,
     now: datetime,
-) -> None:
+    session=None,
+    entry_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Actualiza cache del usuario (balance_cached + lifetime + earned_this_month)
+    en un solo update por pipeline. Maneja rollover mensual en el servidor:
+    si cambia month_key, reinicia earned_this_month a 0 antes de sumar.
+    Retorna el documento resultante (al menos rank y points).
+    """
+    return await update_user_doc(
+        telegram_id,
+        _points_cache_pipeline(signed_delta, month_earned_delta, now, entry_id=entry_id),
+        upsert=True,
+        session=session,
+        projection=_CACHE_PROJECTION,
+    )
+
+
+async def _write_entry_and_cache(entry: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """
+    Inserta el ledger entry y actualiza el cache del usuario.
+    - Con replica set (transacciones): ambos en UNA transacción, sin pasos
+      intermedios visibles (with_transaction reintenta errores transitorios).
+    - Sin transacciones (standalone): ledger primero, marcado cache_applied=False,
+      luego cache (registra el entry_id en points.applied_entry_ids) y por último
+      la marca pasa a True. Si el proceso cae en el medio, reconcile_ledger_cache
+      re-aplica el entry (al arrancar y periódicamente) sin duplicarlo.
+    - Con LEDGER_BATCH_WRITER activo (picos de promo) se RENUNCIA a la atomicidad,
+      también en replica set: el insert va en lote (insert_many), se espera su
+      confirmación y después va el cache, como en standalone (cache_applied=False
+      + applied_entry_ids). Una caída entre ambos deja el saldo desfasado hasta
+      que reconcile_ledger_cache re-aplica el entry.
     """
-    Actualiza cache del usuario (balance_cached + lifetime + earned_this_month).
-    Maneja rollover mensual: si cambia month_key, reinicia earned_this_month a 0 antes de sumar.
-    """
-    db = get_db()
-    mk = _month_key(now)
-
-    user = await db.users.find_one({"telegram_id": telegram_id}, {"rank": 1, "points": 1})
-    if not user:
-        # Si no existe usuario, no deberíamos llegar aquí (porque /start crea user).
-        # Pero por seguridad, lo creamos mínimo.
-        await db.users.insert_one(
-            {
-                "telegram_id": telegram_id,
-                "created_at": now,
-                "policy": {"accepted": False, "accepted_at": None, "version": "1.0"},
-                "status": {"state": "active", "blocked_until": None, "ban_reason": None},
-                "infractions": {"count": 0, "last_at": None},
-                "points": {
-                    "balance_cached": 0,
-                    "lifetime_earned": 0,
-                    "lifetime_spent": 0,
-                    "updated_at": now,
-                },
-                "rank": {"month_key": mk, "earned_this_month": 0},
-                "ascenso_plan": {"type": "FREE", "expires_at": None},
-                "elite": {"active": False, "active_until": None},
-                "titan": {"active": False, "active_until": None, "premium_redeems_count": 0},
-                "admin": {"notes": ""},
-            }
+    signed_delta = int(entry["signed_points"])
+    month_earned_delta = int(entry["month_earned_points"])
+
+    writer = get_ledger_writer()
+    if writer is not None:
+        entry["cache_applied"] = False
+        await writer.submit(entry)
+        user = await _update_user_points_cache(
+            telegram_id=entry["telegram_id"],
+            signed_delta=signed_delta,
+            month_earned_delta=month_earned_delta,
+            now=now,
+            entry_id=entry["entry_id"],
+        )
+        writer.note_applied(entry["entry_id"])
+        return user
+
+    if not supports_transactions():
+        entry["cache_applied"] = False
+        await create_ledger_entry(entry)
+        user = await _update_user_points_cache(
+            telegram_id=entry["telegram_id"],
+            signed_delta=signed_delta,
+            month_earned_delta=month_earned_delta,
+            now=now,
+            entry_id=entry["entry_id"],
+        )
+        await mark_ledger_cache_applied([entry["entry_id"]])
+        return user
+
+    async def _txn(session) -> Dict[str, Any]:
+        # with_transaction puede reintentar: el _id lo asigna insert_one, hay que limpiarlo
+        entry.pop("_id", None)
+        await create_ledger_entry(entry, session=session)
+        return await _update_user_points_cache(
+            telegram_id=entry["telegram_id"],
+            signed_delta=signed_delta,
+            month_earned_delta=month_earned_delta,
+            now=now,
+            session=session,
         )
-        current_month_key = mk
-    else:
-        current_month_key = (user.get("rank") or {}).get("month_key") or mk
 
-    # Si cambió el mes, reseteamos earned_this_month.
-    reset_rank = current_month_key != mk
+    async with await get_client().start_session() as session:
+        user = await session.with_transaction(_txn)
+    # Recién confirmado: ahora sí puede quedar en el cache del request
+    if user:
+        remember_user(user)
+    return user
 
-    update_doc: Dict[str, Any] = {
-        "$inc": {
-            "points.balance_cached": signed_delta,
-            "points.lifetime_earned": max(0, signed_delta),
-            "points.lifetime_spent": max(0, -signed_delta),
-        },
-        "$set": {
-            "points.updated_at": now,
-            "last_seen_at": now,
-        },
-    }
 
-    if reset_rank:
-        update_doc["$set"]["rank.month_key"] = mk
-        update_doc["$set"]["rank.earned_this_month"] = 0
+def _after_points_write(entry: Dict[str, Any], user: Optional[Dict[str, Any]]) -> None:
+    """
+    Hooks en memoria tras un write de puntos confirmado (sin round trips extra:
+    usan el documento que devolvió el update).
+    """
+    if not user or int(entry["month_earned_points"]) <= 0:
+        return
+    rank = user.get("rank") or {}
+    if ((user.get("status") or {}).get("state")) == "banned":
+        return
+    score = int(rank.get("earned_this_month") or 0)
+    note_month_score(entry["telegram_id"], rank.get("month_key"), score)
+    note_rank(entry["telegram_id"], rank)
 
-    if month_earned_delta > 0:
-        update_doc.setdefault("$inc", {})
-        update_doc["$inc"]["rank.earned_this_month"] = month_earned_delta
 
-    await db.users.update_one({"telegram_id": telegram_id}, update_doc)
+async def _record_month_stats(entry: Dict[str, Any], user: Optional[Dict[str, Any]], now: datetime) -> None:
+    """
+    Stats vivas del mes (month_stats): total ganado, earners activos (primer
+    punto del mes: el puntaje nuevo es igual a lo ganado en este entry) y
+    movimientos por reason_code. El snapshot del rollover las copia tal cual.
+    Los baneados no suman a total/earners/máximo (igual que el ranking y el
+    cálculo de respaldo del snapshot: earned > 0 y no baneado); su movimiento
+    sí cuenta en entries.
+    """
+    earned = int(entry["month_earned_points"])
+    score = int(((user or {}).get("rank") or {}).get("earned_this_month") or 0)
+    if (((user or {}).get("status") or {}).get("state")) == "banned":
+        earned, score = 0, 0
+    await inc_month_stats(
+        month_key=entry["month_key"],
+        reason_code=entry.get("reason_code") or "",
+        earned=earned,
+        new_earner=earned > 0 and score == earned,
+        user_month_score=score,
+        now=now,
+    )
 
 
-async def create_points_entry(
+async def _insert_with_unique_entry_id(entry: Dict[str, Any], now: datetime) -> str:
+    """
+    Asigna entry_id y escribe. La unicidad la garantiza el índice único
+    ledger.entry_id (sin leer antes): si choca, se genera otro y se reintenta.
+    Es seguro reintentar: un DuplicateKeyError del ledger significa que este
+    entry no se escribió (y en modo transacción, nada se escribió).
+    """
+    for attempt in range(1, ENTRY_ID_MAX_ATTEMPTS + 1):
+        entry["entry_id"] = _make_entry_id(now)
+        entry.pop("_id", None)
+        try:
+            user = await _write_entry_and_cache(entry, now)
+        except DuplicateKeyError as e:
+            if not _is_entry_id_collision(e) or attempt == ENTRY_ID_MAX_ATTEMPTS:
+                raise
+            continue
+
+        # Ya escrito: nada de aquí en adelante puede disparar un reintento
+        await _after_entry_written(entry, user, now)
+        return entry["entry_id"]
+    raise RuntimeError("unreachable")
+
+
+async def _after_entry_written(entry: Dict[str, Any], user: Optional[Dict[str, Any]], now: datetime) -> None:
+    _after_points_write(entry, user)
+    try:
+        await _record_month_stats(entry, user, now)
+    except Exception:
+        # Stats son derivadas: perderlas no debe fallar un movimiento ya confirmado
+        logger.exception("month_stats update failed for entry %s", entry["entry_id"])
+
+
+async def _insert_entries_with_unique_ids(
+    entries: List[Dict[str, Any]],
+    now: datetime,
+    session=None,
+    max_attempts: int = ENTRY_ID_MAX_ATTEMPTS,
+) -> None:
+    """
+    Inserta un lote de entries en un solo insert_many (ordenado). Si un entry_id
+    choca, los ya insertados quedan y el resto se reintenta con ids nuevos.
+    """
+    done = 0
+    for attempt in range(1, max_attempts + 1):
+        pending = entries[done:]
+        for entry in pending:
+            entry["entry_id"] = _make_entry_id(now)
+            entry.pop("_id", None)
+        try:
+            await create_ledger_entries(pending, session=session)
+            return
+        except BulkWriteError as e:
+            if not _is_batch_entry_id_collision(e) or attempt == max_attempts:
+                raise
+            done += int((e.details or {}).get("nInserted") or 0)
+    raise RuntimeError("unreachable")
+
+
+async def write_guarded_entries(
+    telegram_id: int,
+    pipeline: List[Dict[str, Any]],
+    guard: Dict[str, Any],
+    entries_for: Callable[[Dict[str, Any]], List[Dict[str, Any]]],
+    now: datetime,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Movimiento condicional (ej: canje): `pipeline` ya incluye el cache de puntos
+    (points_cache_fields) y se aplica en UN find_one_and_update solo si el usuario
+    cumple `guard` (ej: saldo >= costo). Dos llamadas concurrentes no pueden pasar
+    ambas el guard con el mismo saldo.
+    Con el documento resultante, `entries_for` arma los entries del ledger, que se
+    escriben en un solo insert_many (con transacción: update + ledger juntos;
+    standalone: cache primero y luego ledger, porque el guard vive en el cache).
+    No pasa por LEDGER_BATCH_WRITER (los canjes son pocos).
+    Retorna el documento, o None si el guard no se cumplió (no se escribió nada).
+    """
+    projection = projection or _CACHE_PROJECTION
+
+    async def _apply(session=None, max_attempts: int = ENTRY_ID_MAX_ATTEMPTS):
+        user = await update_user_doc(
+            telegram_id,
+            pipeline,
+            session=session,
+            projection=projection,
+            filter_extra=guard,
+        )
+        if user is None:
+            return None, []
+        entries = entries_for(user)
+        await _insert_entries_with_unique_ids(entries, now, session=session, max_attempts=max_attempts)
+        return user, entries
+
+    if not supports_transactions():
+        user, entries = await _apply()
+    else:
+        async def _txn(session):
+            return await _apply(session=session, max_attempts=1)
+
+        # Un error de escritura aborta la transacción: si choca un entry_id se
+        # repite todo (update incluido) con ids nuevos.
+        for attempt in range(1, ENTRY_ID_MAX_ATTEMPTS + 1):
+            try:
+                async with await get_client().start_session() as session:
+                    user, entries = await session.with_transaction(_txn)
+                break
+            except BulkWriteError as e:
+                if not _is_batch_entry_id_collision(e) or attempt == ENTRY_ID_MAX_ATTEMPTS:
+                    raise
+        if user is not None:
+            remember_user(user)
+
+    if user is None:
+        return None
+    for entry in entries:
+        await _after_entry_written(entry, user, now)
+    return user
+
+
+async def _reapply_entry(entry: Dict[str, Any], now: datetime) -> None:
+    """
+    Aplica al cache un entry pendiente, solo si su entry_id no está ya en
+    points.applied_entry_ids (el proceso pudo caer después del cache y antes de
+    la marca). Los puntos de ranking solo cuentan si el entry es del mes actual.
+    """
+    telegram_id = entry["telegram_id"]
+    entry_id = entry["entry_id"]
+    ranked = int(entry.get("month_earned_points") or 0)
+    if entry.get("month_key") != month_key_utc(now):
+        ranked = 0
+    pipeline = _points_cache_pipeline(int(entry["signed_points"]), ranked, now, entry_id=entry_id)
+
+    user = await update_user_doc(
+        telegram_id,
+        pipeline,
+        projection=_CACHE_PROJECTION,
+        filter_extra={"points.applied_entry_ids": {"$ne": entry_id}},
+    )
+    if user is None and not await get_user_doc(telegram_id, {"_id": 1}):
+        # Sin documento de usuario: mismo upsert que el write original
+        user = await update_user_doc(telegram_id, pipeline, upsert=True, projection=_CACHE_PROJECTION)
+    if user is not None and ranked:
+        _after_points_write(entry, user)
+
+
+async def reconcile_ledger_cache() -> int:
+    """
+    Tick del scheduler (y arranque): re-aplica al cache los entries escritos sin
+    transacción que quedaron con cache_applied=False más de la gracia.
+    Una sola instancia a la vez (lease). Retorna cuántos entries re-aplicó.
+    month_stats no se corrige (son stats derivadas).
+    """
+    token = await acquire_lease(RECONCILE_LEASE, ledger_reconcile_seconds() * 5)
+    if token is None:
+        return 0
+
+    fixed = 0
+    try:
+        now = datetime.utcnow()
+        before = now - timedelta(seconds=_reconcile_grace_seconds())
+        while True:
+            rows = await list_unapplied_ledger_entries(before, RECONCILE_BATCH)
+            for entry in rows:
+                await _reapply_entry(entry, now)
+                await mark_ledger_cache_applied([entry["entry_id"]])
+                fixed += 1
+            if len(rows) < RECONCILE_BATCH:
+                break
+            await renew_lease(RECONCILE_LEASE, token, ledger_reconcile_seconds() * 5)
+    finally:
+        await release_lease(RECONCILE_LEASE, token)
+
+    if fixed:
+        logger.warning("Ledger reconcile: re-applied %d pending entries to the user cache", fixed)
+    return fixed
+
+
+def new_points_entry(
     telegram_id: int,
     entry_type: str,
     category: str,
     reason_code: str,
     points: int,
-    meta: Optional[Dict[str, Any]] = None,
-) -> str:
+    meta: Optional[Dict[str, Any]],
+    now: datetime,
+) -> Dict[str, Any]:
     """
-    Crea un movimiento estándar (EARN/BONUS/SPEND/PENALTY).
-    - Inserta en ledger
-    - Actualiza balance_cached y earned_this_month
-    Retorna entry_id.
+    Arma un movimiento estándar (EARN/BONUS/SPEND/PENALTY) sin escribirlo.
     """
-    now = datetime.utcnow()
-    entry_id = _make_entry_id(now)
-
-    # Evita duplicados por entry_id (muy raro, pero por seguridad)
-    existing = await get_ledger_entry_by_entry_id(entry_id)
-    if existing:
-        # si colisiona, generamos otro
-        entry_id = _make_entry_id(now)
-
     signed_points, month_earned_points = _compute_signed_and_month_earned(entry_type, points)
-
-    entry = {
-        "entry_id": entry_id,
+    return {
+        "entry_id": None,  # se asigna al escribir (ver _insert_with_unique_entry_id)
         "telegram_id": telegram_id,
         "type": entry_type,
         "category": category,
@@ -156,19 +518,28 @@ async def create_points_entry(
         "signed_points": int(signed_points),
         "month_earned_points": int(month_earned_points),
         "meta": meta or {},
-        "month_key": _month_key(now),
+        "month_key": month_key_utc(now),
         "created_at": now,
     }
 
-    # Inserta ledger y actualiza cache (orden importante: ledger primero, luego cache)
-    await create_ledger_entry(entry)
-    await _update_user_points_cache(
-        telegram_id=telegram_id,
-        signed_delta=signed_points,
-        month_earned_delta=month_earned_points,
-        now=now,
-    )
-    return entry_id
+
+async def create_points_entry(
+    telegram_id: int,
+    entry_type: str,
+    category: str,
+    reason_code: str,
+    points: int,
+    meta: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Crea un movimiento estándar (EARN/BONUS/SPEND/PENALTY).
+    - Inserta en ledger
+    - Actualiza balance_cached y earned_this_month
+    Retorna entry_id.
+    """
+    now = datetime.utcnow()
+    entry = new_points_entry(telegram_id, entry_type, category, reason_code, points, meta, now)
+    return await _insert_with_unique_entry_id(entry, now)
 
 
 async def create_adjust(
@@ -185,12 +556,10 @@ async def create_adjust(
         raise ValueError("delta_signed cannot be 0")
 
     now = datetime.utcnow()
-    entry_id = _make_entry_id(now)
-
     month_earned = delta_signed if delta_signed > 0 else 0
 
     entry = {
-        "entry_id": entry_id,
+        "entry_id": None,  # se asigna al escribir (ver _insert_with_unique_entry_id)
         "telegram_id": telegram_id,
         "type": TYPE_ADJUST,
         "category": CAT_ADMIN,
@@ -199,32 +568,8 @@ async def create_adjust(
         "signed_points": int(delta_signed),
         "month_earned_points": int(month_earned),
         "meta": {**(meta or {}), "delta_signed": int(delta_signed)},
-        "month_key": _month_key(now),
+        "month_key": month_key_utc(now),
         "created_at": now,
     }
 
-    await create_ledger_entry(entry)
-    await _update_user_points_cache(
-        telegram_id=telegram_id,
-        signed_delta=int(delta_signed),
-        month_earned_delta=int(month_earned),
-        now=now,
-    )
-    return entry_id
-
-
-async def ensure_user_has_points(telegram_id: int, cost_points: int) -> bool:
-    """
-    Verifica si el usuario tiene saldo suficiente (usa balance_cached).
-    """
-    db = get_db()
-    user = await db.users.find_one({"telegram_id": telegram_id}, {"points.balance_cached": 1, "status": 1})
-    if not user:
-        return False
-
-    state = (user.get("status") or {}).get("state", "active")
-    if state in ("blocked", "banned"):
-        return False
-
-    bal = int(((user.get("points") or {}).get("balance_cached")) or 0)
-    return bal >= int(cost_points)
+    return await _insert_with_unique_entry_id(entry, now)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+from app.db.connection import get_db
+from app.db.models.ledger_model import mark_ledger_cache_applied
+from app.services.env import get_int_env
+
+logger = logging.getLogger(__name__)
+
+
+def ledger_batch_enabled() -> bool:
+    return os.getenv("LEDGER_BATCH_WRITER", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+class LedgerBatchWriter:
+    """
+    Write-behind para el ledger: junta entries durante unos ms (o hasta N)
+    y los inserta con un solo insert_many(ordered=False).
+    submit() devuelve un Future que resuelve al entry_id cuando el lote se escribió
+    (o falla con el error de ESE entry, ej: DuplicateKeyError).
+    Sin atomicidad ledger+cache: los entries van con cache_applied=False y
+    note_applied() junta las marcas para el próximo flush (un update_many).
+    """
+
+    def __init__(self, max_batch: int, max_delay_ms: int):
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0, max_delay_ms) / 1000.0
+
+        self._buffer: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._applied: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._flush_pending = False
+        self._closed = False
+
+        # Métricas
+        self.batches = 0
+        self.entries = 0
+        self.failed_entries = 0
+        self.max_batch_seen = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+
+    def submit(self, entry: Dict[str, Any]) -> asyncio.Future:
+        if self._closed:
+            raise RuntimeError("LedgerBatchWriter is closed")
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._buffer.append((entry, fut))
+        self._arm()
+        return fut
+
+    def note_applied(self, entry_id: str) -> None:
+        """
+        El cache del usuario ya tiene este entry: su cache_applied pasa a True
+        en el próximo flush (si se pierde, el reconciliador lo marca igual).
+        """
+        self._applied.append(entry_id)
+        if not self._closed:
+            self._arm()
+
+    def _arm(self) -> None:
+        # Lote lleno => flush ya; si no, flush cuando venza el delay del primero
+        if not (self._buffer or self._applied) or self._flush_pending:
+            return
+        if len(self._buffer) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._schedule_flush)
+
+    def _schedule_flush(self) -> None:
+        self._flush_pending = True
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self) -> None:
+        """
+        Escribe hasta max_batch entries del buffer (y rearma si quedan más).
+        """
+        self._flush_pending = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._buffer[: self.max_batch]
+        self._buffer = self._buffer[self.max_batch :]
+        applied, self._applied = self._applied, []
+        if not self._closed:
+            self._arm()
+
+        if applied:
+            try:
+                await mark_ledger_cache_applied(applied)
+            except Exception:
+                logger.exception("Ledger batch: marking %d entries as applied failed", len(applied))
+        if not batch:
+            return
+
+        db = get_db()
+        started = time.perf_counter()
+        failed: Dict[int, Exception] = {}
+        try:
+            await db.ledger.insert_many([entry for entry, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # ordered=False: el resto del lote sí se insertó; solo fallan estos índices
+            for err in e.details.get("writeErrors", []):
+                cls = DuplicateKeyError if err.get("code") == 11000 else WriteError
+                failed[int(err["index"])] = cls(err.get("errmsg", "write error"), err.get("code"), err)
+        except Exception as e:
+            failed = {i: e for i in range(len(batch))}
+
+        for i, (entry, fut) in enumerate(batch):
+            if fut.done():
+                continue
+            if i in failed:
+                fut.set_exception(failed[i])
+            else:
+                fut.set_result(entry["entry_id"])
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.entries += len(batch)
+        self.failed_entries += len(failed)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.flush_ms_total += elapsed_ms
+        self.flush_ms_max = max(self.flush_ms_max, elapsed_ms)
+        logger.debug("Ledger batch flushed: size=%d failed=%d ms=%.1f", len(batch), len(failed), elapsed_ms)
+
+    async def close(self) -> None:
+        """
+        Deja de aceptar entries y escribe todo lo pendiente (shutdown).
+        """
+        self._closed = True
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes), return_exceptions=True)
+        while self._buffer or self._applied:
+            await self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "entries": self.entries,
+            "failed_entries": self.failed_entries,
+            "pending": len(self._buffer),
+            "avg_batch_size": round(self.entries / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_flush_ms": round(self.flush_ms_total / self.batches, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self.flush_ms_max, 2),
+        }
+
+
+_writer: Optional[LedgerBatchWriter] = None
+
+
+def get_ledger_writer() -> Optional[LedgerBatchWriter]:
+    return _writer
+
+
+def start_ledger_writer() -> Optional[LedgerBatchWriter]:
+    """
+    Activa el writer si LEDGER_BATCH_WRITER=1 (renuncia a la atomicidad ledger+cache,
+    ver _write_entry_and_cache). Sin él, cada entry se inserta sola.
+    """
+    global _writer
+    if not ledger_batch_enabled():
+        return None
+    _writer = LedgerBatchWriter(
+        max_batch=get_int_env("LEDGER_BATCH_MAX", 200),
+        max_delay_ms=get_int_env("LEDGER_BATCH_DELAY_MS", 5),
+    )
+    logger.info("Ledger batch writer on (max=%d, delay_ms=%d)", _writer.max_batch, int(_writer.max_delay * 1000))
+    return _writer
+
+
+async def stop_ledger_writer() -> None:
+    global _writer
+    if _writer is None:
+        return
+    writer, _writer = _writer, None
+    await writer.close()
+    logger.info("Ledger batch writer stopped: %s", writer.metrics())
+
+
+async def log_ledger_writer_metrics() -> None:
+    if _writer is not None:
+        logger.info("Ledger batch writer: %s", _writer.metrics())
@@ -1,33 +1,91 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 from app.db.connection import get_db
-from app.db.models.month_snapshots_model import create_month_snapshot_if_missing
+from app.db.models.month_stats_model import get_month_stats
+from app.db.models.month_snapshots_model import create_month_snapshot_if_missing, get_month_snapshot
+from app.services.lease_service import acquire_lease, fenced_filter, release_lease, renew_lease
+from app.services.rank_histogram_service import compute_histogram, month_earned_expr, month_earned_match
+from app.services.ranking_service import MIN_POINTS_TO_QUALIFY
+from app.services.env import get_int_env
+from app.services.periods import month_key_utc
 
+logger = logging.getLogger(__name__)
 
 SYSTEM_STATE_ID = "monthly_reset"
+ROLLOVER_LEASE = "monthly_rollover"
+
+# Último month_key que ESTE proceso vio confirmado en system_state.
+# Los month_key solo avanzan, así que si system_state ya dijo "mes actual",
+# eso sigue siendo cierto hasta que cambie el mes UTC: es seguro entre instancias.
+_confirmed_month_key: Optional[str] = None
+
+
+def rollover_check_seconds() -> int:
+    return max(5, get_int_env("ROLLOVER_CHECK_SECONDS", 60))
+
+
+def _rollover_lease_seconds() -> int:
+    return max(60, get_int_env("ROLLOVER_LEASE_SECONDS", 600))
+
+
+def _reset_batch_size() -> int:
+    return max(100, get_int_env("ROLLOVER_BATCH_SIZE", 2000))
+
+
+def _reset_batch_pause_ms() -> int:
+    return max(0, get_int_env("ROLLOVER_BATCH_PAUSE_MS", 200))
+
+
+def _snapshot_top_n() -> int:
+    return min(1000, max(3, get_int_env("ROLLOVER_SNAPSHOT_TOP_N", 100)))
 
 
 def current_month_key(now: Optional[datetime] = None) -> str:
-    now = now or datetime.utcnow()
-    return now.strftime("%Y-%m")
+    return month_key_utc(now or datetime.utcnow())
 
 
-async def ensure_monthly_rollover() -> Tuple[bool, str]:
+async def _fence(fence_token: int, now: datetime) -> bool:
+    """
+    Marca system_state con nuestro fencing token. False si otra instancia con
+    un token más nuevo ya tomó el rollover (nosotros perdimos el lease).
+    """
+    db = get_db()
+    res = await db.system_state.update_one(
+        fenced_filter(SYSTEM_STATE_ID, fence_token),
+        {"$set": {"fence_token": fence_token, "last_fenced_at": now}},
+    )
+    return res.matched_count == 1
+
+
+async def ensure_monthly_rollover(fence_token: int) -> Tuple[bool, str]:
     """
     Detecta cambio de mes y ejecuta el reset mensual UNA sola vez (global):
-    - Guarda snapshot del mes anterior (top3 + stats) en month_snapshots
+    - Guarda snapshot del mes anterior (top-N + top3 + stats + histograma) en month_snapshots
     - Resetea rank.earned_this_month a 0 y rank.month_key al mes actual
-      para los usuarios que aún estén en el mes anterior.
+      para los usuarios que aún estén en el mes anterior, en lotes por rango
+      de _id con checkpoint (si se interrumpe, el siguiente intento retoma).
+
+    Camino común (mes ya confirmado en este proceso): cero round trips.
+    Lo corre solo el scheduler (run_monthly_rollover_job) bajo el lease;
+    cada escritura (system_state, snapshot y cada lote de users) se hace
+    después de confirmar fence_token.
 
     Retorna (changed, msg)
     """
-    db = get_db()
+    global _confirmed_month_key
+
     now = datetime.utcnow()
     cur_mk = current_month_key(now)
+    if _confirmed_month_key == cur_mk:
+        return False, "No rollover"
 
+    db = get_db()
     state = await db.system_state.find_one({"_id": SYSTEM_STATE_ID})
     if not state:
         # Primera vez: inicializa el mes actual, no hace reset
@@ -36,6 +94,7 @@ async def ensure_monthly_rollover() -> Tuple[bool, str]:
             {"$set": {"month_key": cur_mk, "last_run_at": now}},
             upsert=True,
         )
+        _confirmed_month_key = cur_mk
         return False, "Initialized"
 
     prev_mk = (state.get("month_key") or "").strip()
@@ -44,70 +103,245 @@ async def ensure_monthly_rollover() -> Tuple[bool, str]:
             {"_id": SYSTEM_STATE_ID},
             {"$set": {"month_key": cur_mk, "last_run_at": now}},
         )
+        _confirmed_month_key = cur_mk
         return False, "State fixed"
 
     if prev_mk == cur_mk:
         # No cambió el mes
+        _confirmed_month_key = cur_mk
         return False, "No rollover"
 
-    # ---- 1) Construir TOP 3 del mes anterior ----
+    if not await _fence(fence_token, now):
+        return False, "Lease lost"
+
+    # Si el snapshot ya existe, es un rollover retomado: no se recalcula.
+    if not await get_month_snapshot(prev_mk):
+        if not await _snapshot_previous_month(prev_mk, now, fence_token):
+            return False, "Lease lost"
+
+    # ---- 4) Resetear ranking mensual para los usuarios del mes anterior ----
+    # IMPORTANT: No tocamos balance_cached ni ledger.
+    reset_users, completed = await _reset_users_in_batches(prev_mk, cur_mk, now, fence_token)
+    if not completed:
+        return False, f"Lease lost (reset_users={reset_users}, resumable)"
+
+    # ---- 5) Actualizar system_state (solo si nadie nos quitó el lease) ----
+    res = await db.system_state.update_one(
+        fenced_filter(SYSTEM_STATE_ID, fence_token),
+        {
+            "$set": {
+                "month_key": cur_mk,
+                "last_run_at": now,
+                "prev_month_key": prev_mk,
+                "reset_progress.finished_at": datetime.utcnow(),
+            }
+        },
+    )
+    if res.matched_count != 1:
+        return False, "Lease lost"
+    _confirmed_month_key = cur_mk
+
+    return True, f"Rolled over {prev_mk} -> {cur_mk}, reset_users={reset_users}"
+
+
+async def _snapshot_previous_month(prev_mk: str, now: datetime, fence_token: int) -> bool:
+    """
+    Calcula y guarda el snapshot de prev_mk. Retorna False si perdimos el lease
+    antes de guardarlo (no se escribe nada).
+    """
+    db = get_db()
+
+    # ---- 1) Ranking del mes anterior (top-N, mismo criterio que el ranking en vivo) ----
+    # Quien sumó puntos entre el cambio de mes UTC y este tick ya pasó al mes
+    # nuevo (rollover lazy): sus puntos de prev_mk siguen en rank.earned_prev_month.
+    top_n = _snapshot_top_n()
     pipeline = [
-        {"$match": {"rank.month_key": prev_mk}},
+        {"$match": month_earned_match(prev_mk, MIN_POINTS_TO_QUALIFY)},
+        {"$set": {"_earned": month_earned_expr(prev_mk)}},
+        {"$sort": {"_earned": -1, "telegram_id": 1}},
+        {"$limit": top_n},
         {
             "$project": {
                 "_id": 0,
                 "telegram_id": 1,
                 "username": 1,
                 "first_name": 1,
-                "earned": {"$ifNull": ["$rank.earned_this_month", 0]},
+                "earned": "$_earned",
+                "elite_active": {"$ifNull": ["$elite.active", False]},
+                "titan_active": {"$ifNull": ["$titan.active", False]},
             }
         },
-        {"$sort": {"earned": -1, "telegram_id": 1}},
-        {"$limit": 3},
     ]
-    top3: List[Dict[str, Any]] = await db.users.aggregate(pipeline).to_list(length=3)
+    top: List[Dict[str, Any]] = await db.users.aggregate(pipeline).to_list(length=top_n)
+    for i, row in enumerate(top, start=1):
+        row["position"] = i
+    top3 = [
+        {k: row[k] for k in ("telegram_id", "username", "first_name", "earned") if k in row}
+        for row in top[:3]
+    ]
 
     # ---- 2) Stats del mes anterior ----
-    stats_pipeline = [
-        {"$match": {"rank.month_key": prev_mk}},
-        {
-            "$group": {
-                "_id": None,
-                "users_count": {"$sum": 1},
-                "total_earned": {"$sum": {"$ifNull": ["$rank.earned_this_month", 0]}},
-                "max_earned": {"$max": {"$ifNull": ["$rank.earned_this_month", 0]}},
-            }
-        },
-    ]
-    stats_rows = await db.users.aggregate(stats_pipeline).to_list(length=1)
-    stats = stats_rows[0] if stats_rows else {"users_count": 0, "total_earned": 0, "max_earned": 0}
-    stats.pop("_id", None)
+    # Acumuladas en month_stats por cada write de puntos: copia O(1).
+    live = await get_month_stats(prev_mk)
+    if live:
+        stats = {
+            "users_count": int(live.get("active_earners") or 0),
+            "total_earned": int(live.get("total_earned") or 0),
+            "max_earned": int(live.get("max_earned") or 0),
+            "entries": int(live.get("entries") or 0),
+            "entries_by_reason": live.get("entries_by_reason") or {},
+        }
+    else:
+        # Meses anteriores a month_stats: cálculo completo sobre users, con la
+        # misma definición que month_stats (earned > 0, no baneado)
+        stats_pipeline = [
+            {"$match": month_earned_match(prev_mk, 1)},
+            {"$set": {"_earned": month_earned_expr(prev_mk)}},
+            {
+                "$group": {
+                    "_id": None,
+                    "users_count": {"$sum": 1},
+                    "total_earned": {"$sum": "$_earned"},
+                    "max_earned": {"$max": "$_earned"},
+                }
+            },
+        ]
+        stats_rows = await db.users.aggregate(stats_pipeline).to_list(length=1)
+        stats = stats_rows[0] if stats_rows else {"users_count": 0, "total_earned": 0, "max_earned": 0}
+        stats.pop("_id", None)
 
-    # ---- 3) Guardar snapshot (si no existe ya) ----
+    histogram = await compute_histogram(prev_mk)
+    histogram.pop("month_key", None)
+
+    # ---- 3) Guardar snapshot (si no existe ya), solo si seguimos con el lease ----
+    if not await _fence(fence_token, now):
+        return False
     await create_month_snapshot_if_missing(
         month_key=prev_mk,
         top3=top3,
         stats=stats,
         created_at=now,
+        top=top,
+        histogram=histogram,
     )
+    return True
 
-    # ---- 4) Resetear ranking mensual para los usuarios del mes anterior ----
-    # IMPORTANT: No tocamos balance_cached ni ledger.
-    result = await db.users.update_many(
-        {"rank.month_key": prev_mk},
-        {
-            "$set": {
-                "rank.month_key": cur_mk,
-                "rank.earned_this_month": 0,
-                "rank.last_reset_at": now,
-            }
-        },
-    )
 
-    # ---- 5) Actualizar system_state ----
-    await db.system_state.update_one(
-        {"_id": SYSTEM_STATE_ID},
-        {"$set": {"month_key": cur_mk, "last_run_at": now, "prev_month_key": prev_mk}},
-    )
+async def _reset_users_in_batches(
+    prev_mk: str,
+    cur_mk: str,
+    now: datetime,
+    fence_token: int,
+) -> Tuple[int, bool]:
+    """
+    Recorre users por rango de _id (índice _id, orden estable) en lotes acotados:
+    - update_many solo dentro del rango [primer_id, último_id] del lote, después
+      de confirmar el fencing token (si otra instancia tomó el rollover, no se escribe)
+    - el mes que se cierra queda en rank.prev_month_key / earned_prev_month,
+      igual que en el rollover lazy del write path
+    - checkpoint en system_state.reset_progress (protegido por fence_token)
+    - renueva el lease y duerme entre lotes para no saturar el write path
+    Retorna (usuarios_reseteados_total, completo). completo=False si perdimos el lease.
+    """
+    db = get_db()
+    batch_size = _reset_batch_size()
+    pause = _reset_batch_pause_ms() / 1000.0
+
+    state = await db.system_state.find_one({"_id": SYSTEM_STATE_ID}, {"reset_progress": 1})
+    progress = (state or {}).get("reset_progress") or {}
+    if progress.get("month_key") == prev_mk and not progress.get("finished_at"):
+        last_id = progress.get("last_id")
+        total = int(progress.get("reset_users") or 0)
+        logger.info("Rollover reset %s: resuming after _id=%s (%d users done)", prev_mk, last_id, total)
+    else:
+        last_id = None
+        total = 0
+
+    started = time.monotonic()
+    done_this_run = 0
+
+    while True:
+        query: Dict[str, Any] = {}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        rows = await db.users.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not rows:
+            break
+
+        if not await _fence(fence_token, now):
+            return total, False
+
+        first_id, batch_last_id = rows[0]["_id"], rows[-1]["_id"]
+        result = await db.users.update_many(
+            {"_id": {"$gte": first_id, "$lte": batch_last_id}, "rank.month_key": prev_mk},
+            [
+                {
+                    "$set": {
+                        "rank.prev_month_key": prev_mk,
+                        "rank.earned_prev_month": {"$ifNull": ["$rank.earned_this_month", 0]},
+                        "rank.month_key": cur_mk,
+                        "rank.earned_this_month": 0,
+                        "rank.last_reset_at": now,
+                    }
+                }
+            ],
+        )
+        last_id = batch_last_id
+        total += result.modified_count
+        done_this_run += result.modified_count
+
+        res = await db.system_state.update_one(
+            fenced_filter(SYSTEM_STATE_ID, fence_token),
+            {
+                "$set": {
+                    "reset_progress": {
+                        "month_key": prev_mk,
+                        "last_id": last_id,
+                        "reset_users": total,
+                        "updated_at": datetime.utcnow(),
+                        "finished_at": None,
+                    }
+                }
+            },
+        )
+        if res.matched_count != 1:
+            return total, False
+        await renew_lease(ROLLOVER_LEASE, fence_token, _rollover_lease_seconds())
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        logger.info(
+            "Rollover reset %s: %d users reset (%.0f users/s), last _id=%s",
+            prev_mk,
+            total,
+            done_this_run / elapsed,
+            last_id,
+        )
+
+        if len(rows) < batch_size:
+            break
+        if pause:
+            await asyncio.sleep(pause)
+
+    return total, True
+
+
+async def run_monthly_rollover_job() -> None:
+    """
+    Tick del scheduler: si el mes no está confirmado, toma el lease y corre el rollover.
+    Solo una instancia lo ejecuta; las demás ven el lease tomado y siguen.
+    """
+    if _confirmed_month_key == current_month_key():
+        return
+
+    token = await acquire_lease(ROLLOVER_LEASE, _rollover_lease_seconds())
+    if token is None:
+        return
 
-    return True, f"Rolled over {prev_mk} -> {cur_mk}, reset_users={getattr(result, 'modified_count', 0)}"
+    try:
+        changed, msg = await ensure_monthly_rollover(fence_token=token)
+        if changed:
+            logger.info("Monthly rollover: %s", msg)
+        else:
+            logger.debug("Monthly rollover: %s", msg)
+    finally:
+        await release_lease(ROLLOVER_LEASE, token)
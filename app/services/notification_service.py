@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from app.db.models.notifications_model import (
+    list_pending_notifications,
+    mark_notification_failed,
+    mark_notifications_sent,
+)
+from app.services.lease_service import acquire_lease, release_lease
+from app.services.env import get_int_env
+
+logger = logging.getLogger(__name__)
+
+SENDER_LEASE = "notifications"
+
+# Reintentos ante errores transitorios antes de descartar el mensaje
+MAX_ATTEMPTS = 5
+
+
+def notification_send_seconds() -> int:
+    return max(5, get_int_env("NOTIFICATION_SEND_SECONDS", 15))
+
+
+def _send_batch_size() -> int:
+    return max(1, get_int_env("NOTIFICATION_BATCH_SIZE", 100))
+
+
+def _send_delay_seconds() -> float:
+    # Pausa entre mensajes: Telegram limita ~30 msg/s por bot
+    return max(0, get_int_env("NOTIFICATION_SEND_DELAY_MS", 50)) / 1000.0
+
+
+async def send_pending_notifications(bot: Bot) -> int:
+    """
+    Envía un lote de la cola `notifications`. Una sola instancia envía a la vez
+    (lease), así un mensaje no sale dos veces.
+    - Usuario bloqueó el bot / chat inválido: se descarta (failed).
+    - RetryAfter: corta el lote; lo que falta sale en el próximo tick.
+    - Otros errores: se reintenta hasta MAX_ATTEMPTS.
+    Retorna cuántos envió.
+    """
+    token = await acquire_lease(SENDER_LEASE, notification_send_seconds() * 5)
+    if token is None:
+        return 0
+
+    sent = []
+    try:
+        pending = await list_pending_notifications(_send_batch_size())
+        delay = _send_delay_seconds()
+        for doc in pending:
+            try:
+                await bot.send_message(doc["telegram_id"], doc["text"])
+            except TelegramRetryAfter as e:
+                logger.warning("Notifications: rate limited, retry after %ss", e.retry_after)
+                break
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                await mark_notification_failed(doc["_id"], str(e), final=True)
+                continue
+            except Exception as e:
+                final = int(doc.get("attempts") or 0) + 1 >= MAX_ATTEMPTS
+                await mark_notification_failed(doc["_id"], str(e), final=final)
+                continue
+            sent.append(doc["_id"])
+            if delay:
+                await asyncio.sleep(delay)
+    finally:
+        await mark_notifications_sent(sent, datetime.utcnow())
+        await release_lease(SENDER_LEASE, token)
+
+    if sent:
+        logger.info("Notifications sent: %d", len(sent))
+    return len(sent)
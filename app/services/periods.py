@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+
+# Claves de periodo (UTC) que comparten el write de puntos, los rankings, los
+# índices en memoria y los jobs: si dos módulos no coincidieran, cada write
+# vería un "periodo nuevo" y reiniciaría contadores/índices.
+def month_key_utc(dt: datetime) -> str:
+    return dt.strftime("%Y-%m")
+
+
+def week_key_utc(dt: datetime) -> str:
+    # Semana ISO (la misma que weekly_code_utc del reto semanal)
+    iso_year, iso_week, _ = dt.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import logging
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.db.connection import get_db
+from app.services.lease_service import acquire_lease
+from app.services.env import get_int_env
+from app.services.periods import month_key_utc
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_STATE_ID = "rank_histogram"
+HISTOGRAM_LEASE = "rank_histogram"
+
+# Bordes de los buckets de rank.earned_this_month: [edge_i, edge_i+1).
+# Solo cuentan usuarios con puntos en el mes (>0). El último bucket es abierto.
+BUCKET_EDGES = [1, 5, 10, 20, 30, 40, 50, 60, 70, 80, 100, 125, 150, 200, 250, 300, 400, 500, 750, 1000, 1500, 2000, 3000, 5000]
+
+# Copia en memoria del último histograma (igual en todas las instancias)
+_histogram: Optional[Dict[str, Any]] = None
+
+
+def histogram_refresh_seconds() -> int:
+    return max(30, get_int_env("RANK_HISTOGRAM_SECONDS", 300))
+
+
+def month_earned_match(month_key: str, min_points: int) -> Dict[str, Any]:
+    """
+    Usuarios con al menos `min_points` en `month_key`: los que siguen en ese mes
+    y los que ya pasaron al siguiente por el rollover lazy (rank.prev_month_key).
+    Cada rama usa su índice (rank_month_earned / rank_prev_month_earned).
+    """
+    return {
+        "$or": [
+            {"rank.month_key": month_key, "rank.earned_this_month": {"$gte": min_points}},
+            {"rank.prev_month_key": month_key, "rank.earned_prev_month": {"$gte": min_points}},
+        ],
+        "status.state": {"$ne": "banned"},
+    }
+
+
+def month_earned_expr(month_key: str) -> Dict[str, Any]:
+    """
+    Puntos de `month_key` para un documento que matcheó month_earned_match.
+    """
+    return {
+        "$cond": [
+            {"$eq": ["$rank.month_key", month_key]},
+            {"$ifNull": ["$rank.earned_this_month", 0]},
+            {"$ifNull": ["$rank.earned_prev_month", 0]},
+        ]
+    }
+
+
+async def compute_histogram(month_key: str) -> Dict[str, Any]:
+    """
+    Cuenta usuarios por bucket de puntos del mes con un solo $bucket
+    (usa los índices rank_month_earned / rank_prev_month_earned para el $match).
+    Retorna {month_key, edges, counts, total}.
+    """
+    db = get_db()
+    pipeline = [
+        {"$match": month_earned_match(month_key, BUCKET_EDGES[0])},
+        {
+            "$bucket": {
+                "groupBy": month_earned_expr(month_key),
+                "boundaries": BUCKET_EDGES,
+                "default": "top",
+                "output": {"count": {"$sum": 1}},
+            }
+        },
+    ]
+    rows = await db.users.aggregate(pipeline).to_list(length=len(BUCKET_EDGES) + 1)
+
+    counts = [0] * len(BUCKET_EDGES)
+    for row in rows:
+        if row["_id"] == "top":
+            counts[-1] += int(row["count"])
+        else:
+            counts[BUCKET_EDGES.index(row["_id"])] += int(row["count"])
+
+    return {
+        "month_key": month_key,
+        "edges": list(BUCKET_EDGES),
+        "counts": counts,
+        "total": sum(counts),
+    }
+
+
+async def refresh_rank_histogram_job() -> None:
+    """
+    Tick del scheduler. Una sola instancia por intervalo recalcula el histograma
+    (el lease vence solo, no se libera: limita el recálculo a uno por intervalo);
+    las demás solo leen el documento cacheado en system_state.
+    """
+    global _histogram
+
+    db = get_db()
+    interval = histogram_refresh_seconds()
+
+    token = await acquire_lease(HISTOGRAM_LEASE, max(1, interval - 5))
+    if token is not None:
+        now = datetime.utcnow()
+        hist = await compute_histogram(month_key_utc(now))
+        hist["updated_at"] = now
+        await db.system_state.update_one(
+            {"_id": SYSTEM_STATE_ID},
+            {"$set": hist},
+            upsert=True,
+        )
+        _histogram = hist
+        logger.info("Rank histogram refreshed: month=%s users=%d", hist["month_key"], hist["total"])
+        return
+
+    doc = await db.system_state.find_one({"_id": SYSTEM_STATE_ID})
+    if doc:
+        doc.pop("_id", None)
+        _histogram = doc
+
+
+def get_cached_histogram(month_key: str) -> Optional[Dict[str, Any]]:
+    if _histogram and _histogram.get("month_key") == month_key:
+        return _histogram
+    return None
+
+
+def percentile_from_histogram(hist: Dict[str, Any], points: int) -> Optional[int]:
+    """
+    "Top X%" estimado en O(buckets): usuarios con más puntos / total.
+    Dentro del bucket propio se interpola linealmente.
+    Retorna un entero 1..100, o None si no hay datos o el usuario no tiene puntos.
+    """
+    edges: List[int] = hist.get("edges") or []
+    counts: List[int] = hist.get("counts") or []
+    total = int(hist.get("total") or 0)
+    if points < (edges[0] if edges else 1) or total <= 0:
+        return None
+
+    above = 0.0
+    for i, lo in enumerate(edges):
+        hi = edges[i + 1] if i + 1 < len(edges) else None
+        count = counts[i]
+        if hi is not None and hi <= points:
+            continue  # bucket completo por debajo
+        if lo > points:
+            above += count
+        elif hi is not None:
+            # bucket propio: fracción con más puntos que el usuario
+            above += count * (hi - 1 - points) / max(1, hi - lo)
+
+    # +1: el propio usuario (si el histograma aún no lo contó, no pasa de 100)
+    pct = math.ceil(100.0 * (above + 1) / (total + 1))
+    return max(1, min(100, pct))
+
+
+def get_percentile(month_key: str, points: int) -> Optional[int]:
+    hist = get_cached_histogram(month_key)
+    if hist is None:
+        return None
+    return percentile_from_histogram(hist, points)
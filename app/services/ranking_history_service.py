@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db.models.month_snapshots_model import get_month_snapshot, list_month_snapshot_keys
+
+HISTORY_MONTHS = 12
+HISTORY_PAGE_SIZE = 20
+_MONTHS_TTL = 300.0
+
+# Los snapshots no cambian una vez creados: se cachean por proceso sin TTL.
+_snapshots: Dict[str, Dict[str, Any]] = {}
+_months: Dict[str, Any] = {"keys": None, "expires_at": 0.0}
+
+
+def _safe_name(row: Dict[str, Any]) -> str:
+    username = (row.get("username") or "").strip()
+    if username:
+        return f"@{username}"
+    first = (row.get("first_name") or "").strip()
+    if first:
+        return first
+    return f"ID:{row.get('telegram_id')}"
+
+
+def _badge(row: Dict[str, Any]) -> str:
+    if row.get("titan_active"):
+        return "💎"
+    if row.get("elite_active"):
+        return "🏆"
+    return "•"
+
+
+async def get_history_months() -> List[str]:
+    if _months["keys"] is None or _months["expires_at"] <= time.monotonic():
+        _months["keys"] = await list_month_snapshot_keys(limit=HISTORY_MONTHS)
+        _months["expires_at"] = time.monotonic() + _MONTHS_TTL
+    return _months["keys"]
+
+
+async def _get_snapshot(month_key: str) -> Optional[Dict[str, Any]]:
+    snap = _snapshots.get(month_key)
+    if snap is None:
+        snap = await get_month_snapshot(month_key)
+        if snap:
+            _snapshots[month_key] = snap
+    return snap
+
+
+async def build_history_months_text() -> Tuple[str, List[str]]:
+    """
+    Retorna (texto, month_keys) para el menú de meses anteriores.
+    """
+    months = await get_history_months()
+    if not months:
+        return "🗂️ <b>Rankings anteriores</b>\n\nAún no hay meses cerrados.", []
+    return "🗂️ <b>Rankings anteriores</b>\n\nElige un mes:", months
+
+
+async def build_history_month_text(telegram_id: int, month_key: str, page: int = 0) -> Tuple[str, bool, bool]:
+    """
+    Ranking de un mes cerrado servido desde month_snapshots.
+    Retorna (texto, hay_pagina_anterior, hay_pagina_siguiente).
+    """
+    snap = await _get_snapshot(month_key)
+    if not snap:
+        return "No hay datos guardados para ese mes.", False, False
+
+    top: List[Dict[str, Any]] = snap.get("top") or []
+    if not top:
+        # Snapshots viejos solo guardaban el top 3
+        top = [dict(row, position=i) for i, row in enumerate(snap.get("top3") or [], start=1)]
+
+    pages = max(1, (len(top) + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+    page = min(max(0, page), pages - 1)
+    chunk = top[page * HISTORY_PAGE_SIZE:(page + 1) * HISTORY_PAGE_SIZE]
+
+    lines: List[str] = []
+    lines.append("📜 <b>Ranking del Mes</b>")
+    lines.append(f"🗓️ Mes: <b>{month_key}</b>\n")
+
+    if not chunk:
+        lines.append("Nadie calificó ese mes.")
+    for row in chunk:
+        lines.append(f"{row.get('position')}) {_badge(row)} <b>{_safe_name(row)}</b> — <b>{int(row.get('earned') or 0)}</b> pts")
+
+    stats = snap.get("stats") or {}
+    lines.append("")
+    lines.append(f"👥 Usuarios con actividad: <b>{int(stats.get('users_count') or 0)}</b>")
+    lines.append(f"⭐ Puntos ganados en total: <b>{int(stats.get('total_earned') or 0)}</b>")
+
+    mine = next((row for row in top if row.get("telegram_id") == telegram_id), None)
+    if mine:
+        lines.append(f"\n👤 Tu posición ese mes: <b>#{mine.get('position')}</b> ({int(mine.get('earned') or 0)} pts)")
+
+    if pages > 1:
+        lines.append(f"\nPágina {page + 1}/{pages}")
+
+    return "\n".join(lines), page > 0, page < pages - 1
@@ -1,16 +1,34 @@
 from __future__ import annotations
 
+import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 from app.db.connection import get_db
+from app.db.request_context import get_user_doc
+from app.services.env import get_float_env, get_int_env
+from app.services.leaderboard_index import BOARD_ALL, BOARD_WEEK, get_board_index, get_month_index
+from app.services.rank_histogram_service import get_percentile
+from app.services.tiers_service import is_tier_active
+from app.services.periods import month_key_utc, week_key_utc
 
 MIN_POINTS_TO_QUALIFY = 80
 TOP_LIMIT = 10
 
+# Top 10 pre-renderizado del mes actual (es igual para todos los usuarios).
+# Se invalida por TTL o cuando un write de puntos puede cambiarlo.
+_top_cache: Dict[str, Any] = {
+    "month_key": None,
+    "lines": None,
+    "ids": set(),
+    "cutoff": MIN_POINTS_TO_QUALIFY,
+    "expires_at": 0.0,
+}
 
-def _month_key(dt: datetime) -> str:
-    return dt.strftime("%Y-%m")
+
+# Parámetros de pantalla: se leen una vez al importar (no en cada vista)
+RANK_AROUND_K = min(25, max(1, get_int_env("RANK_AROUND_K", 3)))
+RANKING_CACHE_TTL = max(0.0, get_float_env("RANKING_CACHE_TTL", 30.0))
 
 
 def _safe_username(u: Dict[str, Any]) -> str:
@@ -25,8 +43,8 @@ def _safe_username(u: Dict[str, Any]) -> str:
 
 
 def _badge(u: Dict[str, Any]) -> str:
-    titan_active = bool(((u.get("titan") or {}).get("active")) or False)
-    elite_active = bool(((u.get("elite") or {}).get("active")) or False)
+    titan_active = is_tier_active(u.get("titan"))
+    elite_active = is_tier_active(u.get("elite"))
     if titan_active:
         return "💎"
     if elite_active:
@@ -39,7 +57,7 @@ async def get_top_ranking(month_key: Optional[str] = None) -> Tuple[str, List[Di
     Retorna (month_key, top_users)
     """
     db = get_db()
-    mk = month_key or _month_key(datetime.utcnow())
+    mk = month_key or month_key_utc(datetime.utcnow())
 
     cursor = (
         db.users.find(
@@ -57,7 +75,7 @@ async def get_top_ranking(month_key: Optional[str] = None) -> Tuple[str, List[Di
                 "titan": 1,
             },
         )
-        .sort("rank.earned_this_month", -1)
+        .sort([("rank.earned_this_month", -1), ("telegram_id", 1)])
         .limit(TOP_LIMIT)
     )
 
@@ -65,27 +83,87 @@ async def get_top_ranking(month_key: Optional[str] = None) -> Tuple[str, List[Di
     return mk, top_users
 
 
-async def get_user_month_points(telegram_id: int, month_key: Optional[str] = None) -> Tuple[str, int]:
-    db = get_db()
-    mk = month_key or _month_key(datetime.utcnow())
-
-    u = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"rank": 1, "status": 1},
+def _render_top_lines(top: List[Dict[str, Any]], score_field: str = "earned_this_month") -> List[str]:
+    if not top:
+        return ["Aún no hay usuarios calificados este mes.\n"]
+
+    lines = ["<b>🏆 Top 10</b>"]
+    for i, u in enumerate(top, start=1):
+        pts = int(((u.get("rank") or {}).get(score_field)) or 0)
+        name = _safe_username(u)
+        badge = _badge(u)
+        lines.append(f"{i}) {badge} <b>{name}</b> — <b>{pts}</b> pts")
+    lines.append("")
+    return lines
+
+
+def _store_top_cache(mk: str, top: List[Dict[str, Any]]) -> List[str]:
+    lines = _render_top_lines(top)
+    # Puntaje mínimo para "entrar" al top: el 10º si está lleno, si no el mínimo para calificar
+    cutoff = MIN_POINTS_TO_QUALIFY
+    if len(top) >= TOP_LIMIT:
+        cutoff = int(((top[-1].get("rank") or {}).get("earned_this_month")) or 0)
+    _top_cache.update(
+        month_key=mk,
+        lines=lines,
+        ids={u.get("telegram_id") for u in top},
+        cutoff=cutoff,
+        expires_at=time.monotonic() + RANKING_CACHE_TTL,
     )
+    return lines
+
+
+def _top_block_fresh(mk: str) -> bool:
+    return _top_cache["month_key"] == mk and _top_cache["lines"] is not None and _top_cache["expires_at"] > time.monotonic()
+
+
+async def get_top_block(mk: str) -> List[str]:
+    """
+    Líneas del bloque Top 10 para el mes `mk`, desde cache si está fresco.
+    """
+    if _top_block_fresh(mk):
+        return _top_cache["lines"]
+
+    _, top = await get_top_ranking(mk)
+    return _store_top_cache(mk, top)
+
+
+def invalidate_top_cache() -> None:
+    _top_cache["lines"] = None
+
+
+def note_month_score(telegram_id: int, month_key: str, score: int) -> None:
+    """
+    Write-through desde el write de puntos: invalida el top cacheado si este
+    usuario ya estaba en el top o si su nuevo puntaje alcanza al 10º.
+    (Otras instancias lo ven al vencer el TTL.)
+    """
+    if _top_cache["month_key"] != month_key or _top_cache["lines"] is None:
+        return
+    if telegram_id in _top_cache["ids"] or score >= _top_cache["cutoff"]:
+        invalidate_top_cache()
+
+
+def _month_points_of(u: Optional[Dict[str, Any]], mk: str) -> int:
     if not u:
-        return mk, 0
+        return 0
 
     # Si el usuario está baneado, da 0
     if ((u.get("status") or {}).get("state")) == "banned":
-        return mk, 0
+        return 0
 
     user_mk = ((u.get("rank") or {}).get("month_key")) or mk
     if user_mk != mk:
-        return mk, 0
+        return 0
+
+    return int(((u.get("rank") or {}).get("earned_this_month")) or 0)
+
 
-    pts = int(((u.get("rank") or {}).get("earned_this_month")) or 0)
-    return mk, pts
+async def get_user_month_points(telegram_id: int, month_key: Optional[str] = None) -> Tuple[str, int]:
+    mk = month_key or month_key_utc(datetime.utcnow())
+
+    u = await get_user_doc(telegram_id, {"rank": 1, "status": 1})
+    return mk, _month_points_of(u, mk)
 
 
 async def get_user_position_if_qualified(telegram_id: int, month_key: Optional[str] = None) -> Tuple[str, Optional[int]]:
@@ -93,29 +171,118 @@ async def get_user_position_if_qualified(telegram_id: int, month_key: Optional[s
     Retorna (month_key, position) si el usuario califica (>=80), si no, (month_key, None).
     Position es 1-based.
     """
-    db = get_db()
     mk, my_pts = await get_user_month_points(telegram_id, month_key=month_key)
     if my_pts < MIN_POINTS_TO_QUALIFY:
         return mk, None
 
-    # Cuenta cuántos usuarios tienen MÁS puntos que el usuario (para calcular posición)
-    # Excluye banned y requiere >=80 para estar en ranking
-    higher = await db.users.count_documents(
+    return mk, await _position_of(telegram_id, mk, my_pts)
+
+
+async def _position_of(telegram_id: int, mk: str, my_pts: int) -> int:
+    """
+    Posición 1-based en el orden del ranking (puntos desc, telegram_id asc).
+    """
+    # Camino rápido: índice en memoria del mes (O(log n), sin round trips)
+    index = get_month_index(mk)
+    if index is not None and index.score_of(telegram_id) == my_pts:
+        pos = index.position(telegram_id)
+        if pos is not None:
+            return pos
+
+    # Fallback (índice no sincronizado o desfasado): cuenta en Mongo cuántos van
+    # delante con el mismo orden del top. Excluye banned.
+    db = get_db()
+    ahead = await db.users.count_documents(
         {
             "rank.month_key": mk,
-            "rank.earned_this_month": {"$gt": my_pts},
-            "rank.earned_this_month": {"$gte": MIN_POINTS_TO_QUALIFY},
             "status.state": {"$ne": "banned"},
+            "$or": [
+                {"rank.earned_this_month": {"$gt": my_pts}},
+                {"rank.earned_this_month": my_pts, "telegram_id": {"$lt": telegram_id}},
+            ],
         }
     )
-    return mk, int(higher) + 1
+    return int(ahead) + 1
 
 
-async def build_ranking_text(telegram_id: int) -> str:
+_NEIGHBOR_PROJECTION = {
+    "telegram_id": 1,
+    "username": 1,
+    "first_name": 1,
+    "rank": 1,
+    "elite": 1,
+    "titan": 1,
+}
+
+
+async def get_neighbors(telegram_id: int, mk: str, my_pts: int, k: int) -> List[Tuple[int, Dict[str, Any], int]]:
+    """
+    Hasta k usuarios arriba y k abajo del usuario (incluido), como
+    [(posición, user_doc, puntos)].
+    - Con índice en memoria: vecinos en O(log n) + un solo find con $in para nombres.
+    - Sin índice: dos rangos sobre rank_month_earned (arriba/abajo, limit k), sin scans.
+    """
     db = get_db()
 
-    # Validación básica: usuario existe y aceptó políticas
-    user = await db.users.find_one({"telegram_id": telegram_id}, {"policy": 1, "status": 1})
+    index = get_month_index(mk)
+    if index is not None and index.score_of(telegram_id) == my_pts:
+        around = index.around(telegram_id, k)
+        if around:
+            ids = [tid for _, tid, _ in around]
+            docs = await db.users.find({"telegram_id": {"$in": ids}}, _NEIGHBOR_PROJECTION).to_list(length=len(ids))
+            by_id = {d["telegram_id"]: d for d in docs}
+            return [
+                (pos, by_id.get(tid) or {"telegram_id": tid}, score)
+                for pos, tid, score in around
+            ]
+
+    base = {"rank.month_key": mk, "status.state": {"$ne": "banned"}}
+    above = await (
+        db.users.find(
+            {
+                **base,
+                "$or": [
+                    {"rank.earned_this_month": {"$gt": my_pts}},
+                    {"rank.earned_this_month": my_pts, "telegram_id": {"$lt": telegram_id}},
+                ],
+            },
+            _NEIGHBOR_PROJECTION,
+        )
+        .sort([("rank.earned_this_month", 1), ("telegram_id", -1)])
+        .limit(k)
+        .to_list(length=k)
+    )
+    below = await (
+        db.users.find(
+            {
+                **base,
+                "rank.earned_this_month": {"$gt": 0},
+                "$or": [
+                    {"rank.earned_this_month": {"$lt": my_pts}},
+                    {"rank.earned_this_month": my_pts, "telegram_id": {"$gt": telegram_id}},
+                ],
+            },
+            _NEIGHBOR_PROJECTION,
+        )
+        .sort([("rank.earned_this_month", -1), ("telegram_id", 1)])
+        .limit(k)
+        .to_list(length=k)
+    )
+    me = await get_user_doc(telegram_id, _NEIGHBOR_PROJECTION) or {"telegram_id": telegram_id}
+
+    my_pos = await _position_of(telegram_id, mk, my_pts)
+    rows = list(reversed(above)) + [me] + below
+    first = my_pos - len(above)
+    return [
+        (first + i, u, int(((u.get("rank") or {}).get("earned_this_month")) or 0))
+        for i, u in enumerate(rows)
+    ]
+
+
+def _ranking_gate(user: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Validación básica para ver el ranking: texto de error o None.
+    """
     if not user:
         return "Usuario no encontrado. Escribe /start."
 
@@ -125,27 +292,110 @@ async def build_ranking_text(telegram_id: int) -> str:
     state = (user.get("status") or {}).get("state", "active")
     if state == "banned":
         return "🚫 Estás expulsado del sistema."
+    return None
 
-    mk, top = await get_top_ranking()
+
+async def build_around_text(telegram_id: int) -> str:
+    user = await get_user_doc(telegram_id, {"policy": 1, "status": 1})
+    error = _ranking_gate(user)
+    if error:
+        return error
+
+    mk = month_key_utc(datetime.utcnow())
     _, my_pts = await get_user_month_points(telegram_id, month_key=mk)
-    _, my_pos = await get_user_position_if_qualified(telegram_id, month_key=mk)
+
+    lines: List[str] = []
+    lines.append("👥 <b>Cerca de ti</b>")
+    lines.append(f"🗓️ Mes: <b>{mk}</b>\n")
+
+    if my_pts <= 0:
+        lines.append("Aún no tienes puntos este mes. ¡Completa tareas para aparecer aquí!")
+        return "\n".join(lines)
+
+    for pos, u, pts in await get_neighbors(telegram_id, mk, my_pts, RANK_AROUND_K):
+        name = _safe_username(u)
+        if u.get("telegram_id") == telegram_id:
+            lines.append(f"👉 {pos}) <b>{name}</b> — <b>{pts}</b> pts")
+        else:
+            lines.append(f"{pos}) {_badge(u)} {name} — {pts} pts")
+
+    if my_pts < MIN_POINTS_TO_QUALIFY:
+        faltan = MIN_POINTS_TO_QUALIFY - my_pts
+        lines.append(f"\n• Te faltan: <b>{faltan}</b> pts para entrar al ranking")
+
+    return "\n".join(lines)
+
+
+async def _load_ranking_screen(telegram_id: int, mk: str) -> Optional[Dict[str, Any]]:
+    """
+    Usuario + top 10 de la pantalla de ranking en UN round trip: parte del
+    documento del usuario (índice telegram_id) y trae el top con $lookup
+    (rank_month_earned). La posición no va aquí: sale del índice en memoria
+    (_position_of) y solo para quien califica.
+    Retorna {user, top} o None si el usuario no existe.
+    """
+    db = get_db()
+    pipeline = [
+        {"$match": {"telegram_id": telegram_id}},
+        {"$limit": 1},
+        {"$project": {"_id": 0, "telegram_id": 1, "policy": 1, "status": 1, "rank": 1}},
+        {
+            "$lookup": {
+                "from": "users",
+                "pipeline": [
+                    {
+                        "$match": {
+                            "rank.month_key": mk,
+                            "rank.earned_this_month": {"$gte": MIN_POINTS_TO_QUALIFY},
+                            "status.state": {"$ne": "banned"},
+                        }
+                    },
+                    {"$sort": {"rank.earned_this_month": -1, "telegram_id": 1}},
+                    {"$limit": TOP_LIMIT},
+                    {"$project": {"_id": 0, **_NEIGHBOR_PROJECTION}},
+                ],
+                "as": "top",
+            }
+        },
+    ]
+    rows = await db.users.aggregate(pipeline).to_list(length=1)
+    if not rows:
+        return None
+
+    row = rows[0]
+    top = row.pop("top") or []
+    return {"user": row, "top": top}
+
+
+async def build_ranking_text(telegram_id: int) -> str:
+    mk = month_key_utc(datetime.utcnow())
+
+    if _top_block_fresh(mk):
+        # Top 10 en cache: el usuario sale del cache del request y la posición del índice
+        user = await get_user_doc(telegram_id, {"policy": 1, "status": 1, "rank": 1})
+        error = _ranking_gate(user)
+        if error:
+            return error
+        top_lines = _top_cache["lines"]
+        my_pts = _month_points_of(user, mk)
+        _, my_pos = await get_user_position_if_qualified(telegram_id, month_key=mk)
+    else:
+        # Sin cache: validación + top 10 + puntos en una sola agregación
+        screen = await _load_ranking_screen(telegram_id, mk)
+        user = screen["user"] if screen else None
+        error = _ranking_gate(user)
+        if error:
+            return error
+        top_lines = _store_top_cache(mk, screen["top"])
+        my_pts = _month_points_of(user, mk)
+        my_pos = await _position_of(telegram_id, mk, my_pts) if my_pts >= MIN_POINTS_TO_QUALIFY else None
 
     lines: List[str] = []
     lines.append("📈 <b>Ranking del Mes</b>")
     lines.append(f"🗓️ Mes: <b>{mk}</b>")
     lines.append(f"✅ Para calificar: <b>{MIN_POINTS_TO_QUALIFY}</b> pts en el mes\n")
 
-    if not top:
-        lines.append("Aún no hay usuarios calificados este mes.\n")
-    else:
-        lines.append("<b>🏆 Top 10</b>")
-        for i, u in enumerate(top, start=1):
-            pts = int(((u.get("rank") or {}).get("earned_this_month")) or 0)
-            name = _safe_username(u)
-            badge = _badge(u)
-            lines.append(f"{i}) {badge} <b>{name}</b> — <b>{pts}</b> pts")
-
-        lines.append("")
+    lines.extend(top_lines)
 
     # Estado del usuario actual
     lines.append("<b>👤 Tu estado</b>")
@@ -154,6 +404,9 @@ async def build_ranking_text(telegram_id: int) -> str:
     if my_pts < MIN_POINTS_TO_QUALIFY:
         faltan = MIN_POINTS_TO_QUALIFY - my_pts
         lines.append(f"• Te faltan: <b>{faltan}</b> pts para entrar al ranking")
+        pct = get_percentile(mk, my_pts)
+        if pct is not None:
+            lines.append(f"• Estás en el <b>top {pct}%</b> de los usuarios con puntos este mes")
     else:
         if my_pos is not None:
             lines.append(f"• Tu posición: <b>#{my_pos}</b> ✅")
@@ -163,3 +416,156 @@ async def build_ranking_text(telegram_id: int) -> str:
     lines.append("\n💡 Tip: Las tareas fuertes (Compartir + Reto semanal) empujan el ranking.")
 
     return "\n".join(lines)
+
+
+# ---- Ranking semanal e histórico ----
+# Contadores mantenidos en el mismo write de puntos (ledger_service): el top sale
+# de finds ordenados por índice (rank_week_earned / rank_all_time) y la posición
+# del índice en memoria de cada tablero (leaderboard_index).
+PERIOD_WEEK = "week"
+PERIOD_ALL = "all"
+
+_PERIODS: Dict[str, Dict[str, Any]] = {
+    PERIOD_WEEK: {
+        "title": "📅 <b>Ranking de la Semana</b>",
+        "score_field": "earned_this_week",
+        "key_field": "week_key",
+        "board": BOARD_WEEK,
+    },
+    PERIOD_ALL: {
+        "title": "🏛️ <b>Ranking Histórico</b>",
+        "score_field": "earned_all_time",
+        "key_field": None,
+        "board": BOARD_ALL,
+    },
+}
+
+# period -> {key, lines, expires_at}; solo TTL (el top mensual tiene invalidación write-through)
+_period_top_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def _period_base_filter(period: str, key: Optional[str]) -> Dict[str, Any]:
+    cfg = _PERIODS[period]
+    q: Dict[str, Any] = {"status.state": {"$ne": "banned"}}
+    if cfg["key_field"]:
+        q[f"rank.{cfg['key_field']}"] = key
+    return q
+
+
+def _period_points_of(u: Optional[Dict[str, Any]], period: str, key: Optional[str]) -> int:
+    if not u or ((u.get("status") or {}).get("state")) == "banned":
+        return 0
+    cfg = _PERIODS[period]
+    rank = u.get("rank") or {}
+    if cfg["key_field"] and rank.get(cfg["key_field"]) != key:
+        return 0
+    return int(rank.get(cfg["score_field"]) or 0)
+
+
+async def _period_top_lines(period: str, key: Optional[str]) -> List[str]:
+    cached = _period_top_cache.get(period)
+    if cached and cached["key"] == key and cached["expires_at"] > time.monotonic():
+        return cached["lines"]
+
+    db = get_db()
+    field = f"rank.{_PERIODS[period]['score_field']}"
+    q = _period_base_filter(period, key)
+    q[field] = {"$gt": 0}
+    top = await (
+        db.users.find(q, _NEIGHBOR_PROJECTION)
+        .sort([(field, -1), ("telegram_id", 1)])
+        .limit(TOP_LIMIT)
+        .to_list(length=TOP_LIMIT)
+    )
+    lines = _render_top_lines(top, score_field=_PERIODS[period]["score_field"])
+    if not top:
+        lines = ["Aún no hay usuarios con puntos en este periodo.\n"]
+    _period_top_cache[period] = {
+        "key": key,
+        "lines": lines,
+        "expires_at": time.monotonic() + RANKING_CACHE_TTL,
+    }
+    return lines
+
+
+async def _period_position(telegram_id: int, period: str, key: Optional[str], my_pts: int) -> int:
+    """
+    Posición 1-based en el tablero del periodo (puntos desc, telegram_id asc).
+    """
+    # Camino rápido: índice en memoria del tablero (O(log n), sin round trips)
+    index = get_board_index(_PERIODS[period]["board"], key)
+    if index is not None and index.score_of(telegram_id) == my_pts:
+        pos = index.position(telegram_id)
+        if pos is not None:
+            return pos
+
+    # Fallback (índice no sincronizado o desfasado): conteo en Mongo
+    db = get_db()
+    field = f"rank.{_PERIODS[period]['score_field']}"
+    q = _period_base_filter(period, key)
+    q["$or"] = [
+        {field: {"$gt": my_pts}},
+        {field: my_pts, "telegram_id": {"$lt": telegram_id}},
+    ]
+    return int(await db.users.count_documents(q)) + 1
+
+
+async def backfill_all_time_ranking() -> None:
+    """
+    Migración única: usuarios anteriores a rank.earned_all_time lo siembran con
+    points.lifetime_earned (el write de puntos hace lo mismo de forma lazy, esto
+    cubre a los que no vuelven a ganar). Marcada en system_state para no repetirse.
+    """
+    db = get_db()
+    flag = "migration:rank_all_time"
+    if await db.system_state.find_one({"_id": flag}, {"_id": 1}):
+        return
+
+    res = await db.users.update_many(
+        {"rank.earned_all_time": {"$exists": False}},
+        [{"$set": {"rank.earned_all_time": {"$ifNull": ["$points.lifetime_earned", 0]}}}],
+    )
+    await db.system_state.update_one(
+        {"_id": flag},
+        {"$set": {"done_at": datetime.utcnow(), "users": res.modified_count}},
+        upsert=True,
+    )
+
+
+async def build_period_ranking_text(telegram_id: int, period: str) -> str:
+    """
+    Ranking semanal (semana ISO UTC) o histórico. Sin mínimo para calificar.
+    """
+    if period not in _PERIODS:
+        return await build_ranking_text(telegram_id)
+
+    user = await get_user_doc(telegram_id, {"policy": 1, "status": 1, "rank": 1})
+    error = _ranking_gate(user)
+    if error:
+        return error
+
+    key = week_key_utc(datetime.utcnow()) if period == PERIOD_WEEK else None
+    top_lines = await _period_top_lines(period, key)
+    my_pts = _period_points_of(user, period, key)
+
+    lines: List[str] = []
+    lines.append(_PERIODS[period]["title"])
+    if key:
+        lines.append(f"🗓️ Semana: <b>{key}</b>\n")
+    else:
+        lines.append("")
+
+    lines.extend(top_lines)
+
+    lines.append("<b>👤 Tu estado</b>")
+    lines.append(f"• Puntos ganados: <b>{my_pts}</b>")
+    if my_pts > 0:
+        pos = await _period_position(telegram_id, period, key, my_pts)
+        lines.append(f"• Tu posición: <b>#{pos}</b>")
+    else:
+        lines.append("• Tu posición: —")
+
+    if period == PERIOD_WEEK:
+        lines.append("\n💡 Tip: El Reto semanal suma directo a este ranking.")
+
+    return "\n".join(lines)
@@ -4,10 +4,8 @@ import os
 from datetime import datetime
 from typing import Dict, Any, Tuple
 
-from app.db.connection import get_db
-
-COST_PLUS = 250
-COST_PREMIUM = 400
+from app.db.request_context import get_user_doc
+from app.services.economy_config import get_config
 
 
 def _fmt(dt) -> str:
@@ -22,11 +20,7 @@ async def build_redeem_request_text(telegram_id: int, plan: str) -> Tuple[bool,
     """
     Genera un texto para WhatsApp con ID + saldo + plan solicitado.
     """
-    db = get_db()
-    user = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"points": 1, "ascenso_plan": 1},
-    )
+    user = await get_user_doc(telegram_id, {"points": 1, "ascenso_plan": 1})
     if not user:
         return False, "Usuario no encontrado. Escribe /start."
 
@@ -37,7 +31,8 @@ async def build_redeem_request_text(telegram_id: int, plan: str) -> Tuple[bool,
     if plan not in ("PLUS", "PREMIUM"):
         return False, "Plan inválido."
 
-    cost = COST_PLUS if plan == "PLUS" else COST_PREMIUM
+    cfg = get_config()
+    cost = cfg.cost_plus if plan == "PLUS" else cfg.cost_premium
     ok_text = "SI" if balance >= cost else "NO"
 
     now = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
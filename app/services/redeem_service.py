@@ -1,38 +1,39 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Tuple
+from typing import Any, Dict, List, Tuple
 
-from app.db.connection import get_db
+from app.db.request_context import get_user_doc
+from app.services.achievements_service import ACH_FIRST_REDEEM, grant_expr, not_granted_expr
 from app.services.ledger_service import (
-    create_points_entry,
-    ensure_user_has_points,
+    new_points_entry,
+    points_cache_fields,
+    write_guarded_entries,
     TYPE_SPEND,
     TYPE_BONUS,
     CAT_REDEEM,
     CAT_BONUS,
 )
 
-from app.services.tiers_service import ensure_titan_by_premium_redeems, refresh_tiers
-
-COST_PLUS = 250
-COST_PREMIUM = 400
+from app.services.economy_config import get_config
+from app.services.tiers_service import ensure_titan_by_premium_redeems
 
 REASON_REDEEM_PLUS = "REDEEM_PLUS"
 REASON_REDEEM_PREMIUM = "REDEEM_PREMIUM"
 REASON_BONUS_FIRST = "BONUS_FIRST_REDEEM"
 
-BONUS_FIRST_POINTS = 20
-
-
-def _expires_in_30_days(now: datetime) -> datetime:
-    return now + timedelta(days=30)
+_REDEEM_PROJECTION = {
+    "telegram_id": 1,
+    "rank": 1,
+    "points": 1,
+    "status.state": 1,
+    "redeems": 1,
+    "titan.premium_redeems_count": 1,
+}
 
 
-async def _user_exists(telegram_id: int) -> bool:
-    db = get_db()
-    u = await db.users.find_one({"telegram_id": telegram_id}, {"_id": 1})
-    return bool(u)
+def _plan_expires_at(now: datetime, days: int) -> datetime:
+    return now + timedelta(days=days)
 
 
 async def activate_plus_by_points(user_telegram_id: int, admin_id: int) -> Tuple[bool, str]:
@@ -40,7 +41,7 @@ async def activate_plus_by_points(user_telegram_id: int, admin_id: int) -> Tuple
         user_telegram_id=user_telegram_id,
         admin_id=admin_id,
         plan_type="PLUS",
-        cost=COST_PLUS,
+        cost=get_config().cost_plus,
         reason_code=REASON_REDEEM_PLUS,
     )
 
@@ -50,11 +51,42 @@ async def activate_premium_by_points(user_telegram_id: int, admin_id: int) -> Tu
         user_telegram_id=user_telegram_id,
         admin_id=admin_id,
         plan_type="PREMIUM",
-        cost=COST_PREMIUM,
+        cost=get_config().cost_premium,
         reason_code=REASON_REDEEM_PREMIUM,
     )
 
 
+def _granted_bonus(user: Dict[str, Any]) -> int:
+    # Bonus otorgado por ESTE canje (0 si el logro ya existía)
+    return int(((user.get("redeems") or {}).get("last_bonus")) or 0)
+
+
+def _redeem_pipeline(plan_type: str, cost: int, bonus: int, expires_at: datetime, now: datetime) -> List[Dict[str, Any]]:
+    """
+    Un solo update por pipeline para todo el canje:
+    1) _redeem_bonus: bonus de primer canje solo si falta el logro FIRST_REDEEM
+    2) cache de puntos: -cost (gasto) y +bonus (ganado, suma al ranking)
+    3) plan de Ascenso + logro + contadores (redeems.*, titan.premium_redeems_count)
+    """
+    counters: Dict[str, Any] = {
+        "ascenso_plan.type": plan_type,
+        "ascenso_plan.expires_at": expires_at,
+        "achievements": grant_expr(ACH_FIRST_REDEEM),
+        "redeems.count": {"$add": [{"$ifNull": ["$redeems.count", 0]}, 1]},
+        "redeems.last_at": now,
+        "redeems.last_bonus": "$_redeem_bonus",
+    }
+    if plan_type == "PREMIUM":
+        counters["titan.premium_redeems_count"] = {"$add": [{"$ifNull": ["$titan.premium_redeems_count", 0]}, 1]}
+
+    return [
+        {"$set": {"_redeem_bonus": {"$cond": [not_granted_expr(ACH_FIRST_REDEEM), bonus, 0]}}},
+        {"$set": points_cache_fields(earned="$_redeem_bonus", spent=cost, ranked="$_redeem_bonus", now=now)},
+        {"$set": counters},
+        {"$project": {"_redeem_bonus": 0}},
+    ]
+
+
 async def _redeem_plan(
     user_telegram_id: int,
     admin_id: int,
@@ -62,61 +94,65 @@ async def _redeem_plan(
     cost: int,
     reason_code: str,
 ) -> Tuple[bool, str]:
-    db = get_db()
-
-    if not await _user_exists(user_telegram_id):
-        return False, "Usuario no encontrado."
-
-    await refresh_tiers(user_telegram_id)
-
-    if not await ensure_user_has_points(user_telegram_id, cost):
-        return False, "Saldo insuficiente o usuario bloqueado/expulsado."
-
+    """
+    Canje atómico: el saldo se valida y descuenta en el mismo write que activa
+    el plan (guard points.balance_cached >= cost), así dos admins a la vez no
+    pueden sobregirar. Los movimientos del ledger se escriben después en un lote.
+    """
+    cfg = get_config()
     now = datetime.utcnow()
-    expires_at = _expires_in_30_days(now)
-
-    # 1) Descontar puntos (ledger SPEND)
-    await create_points_entry(
-        telegram_id=user_telegram_id,
-        entry_type=TYPE_SPEND,
-        category=CAT_REDEEM,
-        reason_code=reason_code,
-        points=cost,
-        meta={"admin_id": admin_id, "plan_type": plan_type, "expires_at": expires_at.isoformat()},
-    )
-
-    # 2) Activar plan en Ascenso (30 días)
-    await db.users.update_one(
-        {"telegram_id": user_telegram_id},
-        {"$set": {"ascenso_plan.type": plan_type, "ascenso_plan.expires_at": expires_at, "last_seen_at": now}},
+    expires_at = _plan_expires_at(now, cfg.plan_days)
+
+    def _entries(user: Dict[str, Any]) -> List[Dict[str, Any]]:
+        entries = [
+            new_points_entry(
+                user_telegram_id,
+                TYPE_SPEND,
+                CAT_REDEEM,
+                reason_code,
+                cost,
+                {"admin_id": admin_id, "plan_type": plan_type, "expires_at": expires_at.isoformat()},
+                now,
+            )
+        ]
+        bonus = _granted_bonus(user)
+        if bonus > 0:
+            entries.append(
+                new_points_entry(
+                    user_telegram_id,
+                    TYPE_BONUS,
+                    CAT_BONUS,
+                    REASON_BONUS_FIRST,
+                    bonus,
+                    {"admin_id": admin_id, "note": "Bono primer logro"},
+                    now,
+                )
+            )
+        return entries
+
+    user = await write_guarded_entries(
+        user_telegram_id,
+        _redeem_pipeline(plan_type, cost, cfg.bonus_first_points, expires_at, now),
+        guard={
+            "status.state": {"$nin": ["blocked", "banned"]},
+            "points.balance_cached": {"$gte": cost},
+        },
+        entries_for=_entries,
+        now=now,
+        projection=_REDEEM_PROJECTION,
     )
+    if user is None:
+        if not await get_user_doc(user_telegram_id, {"_id": 1}):
+            return False, "Usuario no encontrado."
+        return False, "Saldo insuficiente o usuario bloqueado/expulsado."
 
-    # 3) Bonus primer logro (+20) SOLO una vez en la vida
-    already_bonus = bool(
-        await db.ledger.find_one(
-            {"telegram_id": user_telegram_id, "reason_code": REASON_BONUS_FIRST},
-            {"_id": 1},
-        )
-    )
-    if not already_bonus:
-        await create_points_entry(
-            telegram_id=user_telegram_id,
-            entry_type=TYPE_BONUS,
-            category=CAT_BONUS,
-            reason_code=REASON_BONUS_FIRST,
-            points=BONUS_FIRST_POINTS,
-            meta={"admin_id": admin_id, "note": "Bono primer logro"},
-        )
-
-    # 4) Contador Premium → Titan
+    # Contador Premium → Titan (solo si el contador ya llegó al umbral)
     extra = ""
     if plan_type == "PREMIUM":
-        await db.users.update_one(
-            {"telegram_id": user_telegram_id},
-            {"$inc": {"titan.premium_redeems_count": 1}},
-        )
-        ok_t, _ = await ensure_titan_by_premium_redeems(user_telegram_id)
-        if ok_t:
-            extra = " ✅ Titan activado por canjes Premium."
-
-    return True, f"✅ Plan {plan_type} activado (30 días) y descontados {cost} pts.{extra}"
+        count = int(((user.get("titan") or {}).get("premium_redeems_count")) or 0)
+        if count >= cfg.titan_premium_redeems:
+            ok_t, _ = await ensure_titan_by_premium_redeems(user_telegram_id)
+            if ok_t:
+                extra = " ✅ Titan activado por canjes Premium."
+
+    return True, f"✅ Plan {plan_type} activado ({cfg.plan_days} días) y descontados {cost} pts.{extra}"
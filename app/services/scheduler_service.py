@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+JobFn = Callable[[], Awaitable[None]]
+
+_jobs: List[Tuple[str, float, JobFn]] = []
+_tasks: List[asyncio.Task] = []
+
+
+def register_job(name: str, interval_seconds: float, fn: JobFn) -> None:
+    """
+    Registra un trabajo periódico. Se ejecuta en background desde start_scheduler(),
+    nunca dentro de un update de Telegram.
+    """
+    _jobs.append((name, float(interval_seconds), fn))
+
+
+async def _run_job(name: str, interval_seconds: float, fn: JobFn) -> None:
+    while True:
+        try:
+            await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Un fallo no mata el loop: se reintenta en el siguiente tick
+            logger.exception("Scheduled job failed: %s", name)
+        await asyncio.sleep(interval_seconds)
+
+
+def start_scheduler() -> None:
+    for name, interval_seconds, fn in _jobs:
+        _tasks.append(asyncio.create_task(_run_job(name, interval_seconds, fn), name=f"job:{name}"))
+        logger.info("Scheduled job started: %s (every %ss)", name, interval_seconds)
+
+
+async def stop_scheduler() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-import os
 from datetime import datetime, timedelta
 from typing import Tuple, Dict, Any, Optional
 
-from app.db.connection import get_db
+from app.db.request_context import get_user_doc, update_user_doc
+from app.services.access_gate import mark_banned, mark_blocked
+from app.services.economy_config import get_config
+from app.services.leaderboard_index import remove_user
+from app.services.ranking_service import invalidate_top_cache
 from app.services.ledger_service import (
     create_points_entry,
     TYPE_PENALTY,
@@ -17,27 +20,15 @@ REASON_SECURITY_BAN = "SECURITY_BAN"
 
 
 def _get_first_penalty_points() -> int:
-    try:
-        v = int(os.getenv("PENALTY_FIRST_POINTS", "50").strip())
-        return max(1, v)
-    except Exception:
-        return 50
+    return get_config().penalty_first_points
 
 
 def _get_block_days() -> int:
-    try:
-        v = int(os.getenv("BLOCK_DAYS", "7").strip())
-        return max(1, v)
-    except Exception:
-        return 7
+    return get_config().block_days
 
 
 async def get_user_security_snapshot(telegram_id: int) -> Tuple[bool, str, Optional[dict]]:
-    db = get_db()
-    user = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"status": 1, "infractions": 1, "points.balance_cached": 1},
-    )
+    user = await get_user_doc(telegram_id, {"status": 1, "infractions": 1, "points.balance_cached": 1})
     if not user:
         return False, "Usuario no encontrado.", None
     return True, "OK", user
@@ -50,11 +41,7 @@ async def apply_next_infraction(user_telegram_id: int, admin_id: int, note: str
     - count=1 => 2da: bloqueo temporal
     - count>=2 => 3ra: expulsión definitiva
     """
-    db = get_db()
-    user = await db.users.find_one(
-        {"telegram_id": user_telegram_id},
-        {"infractions": 1, "status": 1, "points.balance_cached": 1},
-    )
+    user = await get_user_doc(user_telegram_id, {"infractions": 1, "status": 1, "points.balance_cached": 1})
     if not user:
         return False, "Usuario no encontrado."
 
@@ -86,12 +73,11 @@ async def apply_next_infraction(user_telegram_id: int, admin_id: int, note: str
                 meta={"admin_id": admin_id, "note": note or "Primera infracción"},
             )
 
-        await db.users.update_one(
-            {"telegram_id": user_telegram_id},
+        await update_user_doc(
+            user_telegram_id,
             {
                 "$set": {
                     "infractions.last_at": now,
-                    "last_seen_at": now,
                 },
                 "$inc": {"infractions.count": 1},
             },
@@ -104,35 +90,40 @@ async def apply_next_infraction(user_telegram_id: int, admin_id: int, note: str
         days = _get_block_days()
         blocked_until = now + timedelta(days=days)
 
-        await db.users.update_one(
-            {"telegram_id": user_telegram_id},
+        await update_user_doc(
+            user_telegram_id,
             {
                 "$set": {
                     "status.state": "blocked",
                     "status.blocked_until": blocked_until,
                     "status.ban_reason": None,
                     "infractions.last_at": now,
-                    "last_seen_at": now,
                 },
                 "$inc": {"infractions.count": 1},
             },
         )
 
+        mark_blocked(user_telegram_id, blocked_until)
+
         return True, f"⛔ 2da infracción aplicada. Bloqueo temporal por {days} días (hasta {blocked_until.strftime('%Y-%m-%d %H:%M UTC')})."
 
     # 3ra infracción: expulsión definitiva
-    await db.users.update_one(
-        {"telegram_id": user_telegram_id},
+    await update_user_doc(
+        user_telegram_id,
         {
             "$set": {
                 "status.state": "banned",
                 "status.blocked_until": None,
                 "status.ban_reason": note or "Tercera infracción",
                 "infractions.last_at": now,
-                "last_seen_at": now,
             },
             "$inc": {"infractions.count": 1},
         },
     )
 
+    # Un baneado desaparece del ranking: el top cacheado ya no sirve
+    invalidate_top_cache()
+    remove_user(user_telegram_id)
+    mark_banned(user_telegram_id)
+
     return True, "🚫 3ra infracción aplicada. Usuario expulsado definitivamente (banned)."
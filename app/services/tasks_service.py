@@ -4,20 +4,20 @@ import os
 from datetime import datetime
 from typing import Any, Dict, Optional, Tuple
 
-from app.db.connection import get_db
 from app.db.models.task_claim_model import create_task_claim, find_user_claim_for_day
+from app.db.request_context import get_user_doc
 from app.services.ledger_service import (
     create_points_entry,
     CAT_TASK,
     TYPE_EARN,
 )
 
-from app.services.tiers_service import get_multiplier, ensure_auto_tier_by_month_points, refresh_tiers
+from app.services.economy_config import get_config
+from app.services.tiers_service import get_multiplier, ensure_auto_tier_by_month_points
 
 # ---- Configuración de puntos (V1) ----
-PTS_CHECKIN = 2
-PTS_LESSON_QUIZ = 3
-PTS_SHARE_POST = 6  # (pendiente de aprobación, NO se otorga inmediato)
+# Puntos base por tarea: get_config().pts_checkin / pts_lesson_quiz / pts_share_post
+# (share post queda pendiente de aprobación, NO se otorga inmediato)
 
 TASK_CHECKIN = "TASK_DAILY_CHECKIN"
 TASK_LESSON = "TASK_LESSON_QUIZ"
@@ -52,20 +52,13 @@ def share_post_text(telegram_id: int) -> str:
 
 
 async def _ensure_user_ok(telegram_id: int) -> Tuple[bool, str]:
-    db = get_db()
-    user = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"policy": 1, "status": 1},
-    )
+    user = await get_user_doc(telegram_id, {"policy": 1, "status": 1})
     if not user:
         return False, "Usuario no encontrado. Escribe /start."
 
     if not ((user.get("policy") or {}).get("accepted")):
         return False, "Debes aceptar las políticas primero. Usa /policy y /accept."
 
-    # refresca tiers para apagar expirados
-    await refresh_tiers(telegram_id)
-
     state = (user.get("status") or {}).get("state", "active")
     if state == "blocked":
         return False, "⛔ Estás bloqueado temporalmente."
@@ -94,8 +87,9 @@ async def claim_daily_checkin(telegram_id: int) -> Tuple[bool, str]:
     if existing:
         return False, "✅ Ya reclamaste tu check-in de hoy."
 
+    base = get_config().pts_checkin
     mult = await get_multiplier(telegram_id)
-    pts = _apply_multiplier(PTS_CHECKIN, mult)
+    pts = _apply_multiplier(base, mult)
 
     claim_doc: Dict[str, Any] = {
         "telegram_id": telegram_id,
@@ -105,7 +99,7 @@ async def claim_daily_checkin(telegram_id: int) -> Tuple[bool, str]:
         "day_key": dk,
         "created_at": now,
         "approved_at": now,
-        "meta": {"mult": mult, "base": PTS_CHECKIN},
+        "meta": {"mult": mult, "base": base},
     }
     await create_task_claim(claim_doc)
 
@@ -115,7 +109,7 @@ async def claim_daily_checkin(telegram_id: int) -> Tuple[bool, str]:
         category=CAT_TASK,
         reason_code=TASK_CHECKIN,
         points=pts,
-        meta={"day_key": dk, "mult": mult, "base": PTS_CHECKIN},
+        meta={"day_key": dk, "mult": mult, "base": base},
     )
 
     # Evaluar ascenso automático por puntos del mes
@@ -136,8 +130,9 @@ async def award_lesson_quiz(telegram_id: int) -> Tuple[bool, str]:
     if existing:
         return False, "✅ Ya completaste la mini lección de hoy."
 
+    base = get_config().pts_lesson_quiz
     mult = await get_multiplier(telegram_id)
-    pts = _apply_multiplier(PTS_LESSON_QUIZ, mult)
+    pts = _apply_multiplier(base, mult)
 
     claim_doc: Dict[str, Any] = {
         "telegram_id": telegram_id,
@@ -147,7 +142,7 @@ async def award_lesson_quiz(telegram_id: int) -> Tuple[bool, str]:
         "day_key": dk,
         "created_at": now,
         "approved_at": now,
-        "meta": {"quiz": "v1", "mult": mult, "base": PTS_LESSON_QUIZ},
+        "meta": {"quiz": "v1", "mult": mult, "base": base},
     }
     await create_task_claim(claim_doc)
 
@@ -157,7 +152,7 @@ async def award_lesson_quiz(telegram_id: int) -> Tuple[bool, str]:
         category=CAT_TASK,
         reason_code=TASK_LESSON,
         points=pts,
-        meta={"day_key": dk, "quiz": "v1", "mult": mult, "base": PTS_LESSON_QUIZ},
+        meta={"day_key": dk, "quiz": "v1", "mult": mult, "base": base},
     )
 
     await ensure_auto_tier_by_month_points(telegram_id)
@@ -176,11 +171,12 @@ async def submit_share_post_evidence(
 
     now = datetime.utcnow()
     code = weekly_code_utc(now)
+    base = get_config().pts_share_post
 
     claim_doc: Dict[str, Any] = {
         "telegram_id": telegram_id,
         "task_code": TASK_SHARE,
-        "points": PTS_SHARE_POST,  # base guardado, multiplicador se aplica al aprobar
+        "points": base,  # base guardado, multiplicador se aplica al aprobar
         "status": "pending",
         "day_key": None,
         "created_at": now,
@@ -189,7 +185,7 @@ async def submit_share_post_evidence(
             "weekly_code": code,
             "photo_file_id": photo_file_id,
             "caption": caption or "",
-            "base": PTS_SHARE_POST,
+            "base": base,
         },
     }
     await create_task_claim(claim_doc)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.db.connection import get_db
+from app.services.lease_service import acquire_lease, release_lease, renew_lease
+from app.services.ranking_service import invalidate_top_cache
+from app.services.tiers_service import elite_threshold, tier_days, titan_threshold
+from app.services.env import get_int_env
+from app.services.periods import month_key_utc
+
+logger = logging.getLogger(__name__)
+
+SWEEP_LEASE = "tier_expiry"
+
+_TIERS = ("titan", "elite")
+_PROJECTION = {"_id": 0, "telegram_id": 1, "elite": 1, "titan": 1, "rank": 1, "status": 1}
+
+
+def tier_sweep_seconds() -> int:
+    return max(10, get_int_env("TIER_SWEEP_SECONDS", 60))
+
+
+def _sweep_batch_size() -> int:
+    return max(50, get_int_env("TIER_SWEEP_BATCH_SIZE", 500))
+
+
+def _expired(tier: Dict[str, Any], now: datetime) -> bool:
+    until = tier.get("active_until")
+    return bool(tier.get("active")) and isinstance(until, datetime) and until <= now
+
+
+def _plan_user(user: Dict[str, Any], now: datetime, mk: str) -> Optional[UpdateOne]:
+    """
+    Reglas de expiración para un usuario:
+    1) Apaga Elite/Titan vencidos.
+    2) Reactivación encadenada: si sigue cumpliendo el umbral del MES actual,
+       se reactiva TIER_DAYS desde ahora (Titan manda: si Titan se reactiva,
+       Elite vencido solo se apaga). Banned nunca se reactiva.
+    El filtro exige que el vencimiento siga igual: si otro write lo extendió
+    entre la lectura y el bulk, ese update no aplica (lo revisa el próximo barrido).
+    """
+    tid = user["telegram_id"]
+    rank = user.get("rank") or {}
+    banned = ((user.get("status") or {}).get("state")) == "banned"
+    earned = int(rank.get("earned_this_month") or 0) if (rank.get("month_key") or mk) == mk else 0
+
+    flt: Dict[str, Any] = {"telegram_id": tid}
+    updates: Dict[str, Any] = {}
+    reactivated = False
+
+    for name in _TIERS:
+        tier = user.get(name) or {}
+        if not _expired(tier, now):
+            continue
+        flt[f"{name}.active"] = True
+        flt[f"{name}.active_until"] = tier.get("active_until")
+
+        threshold = titan_threshold() if name == "titan" else elite_threshold()
+        if not banned and not reactivated and earned >= threshold:
+            updates[f"{name}.active"] = True
+            updates[f"{name}.active_until"] = now + timedelta(days=tier_days())
+            updates[f"{name}.forced"] = False
+            reactivated = True
+        else:
+            updates[f"{name}.active"] = False
+            updates[f"{name}.active_until"] = None
+            updates[f"{name}.forced"] = False
+            updates[f"{name}.forced_by_admin_id"] = None
+            updates[f"{name}.forced_note"] = None
+
+    if not updates:
+        return None
+    return UpdateOne(flt, {"$set": updates})
+
+
+async def sweep_expired_tiers(fence_token: Optional[int] = None) -> int:
+    """
+    Busca tiers vencidos por índice (elite/titan.active_until, parcial sobre active=True)
+    y los expira/reactiva en lotes con bulk_write sin orden.
+    Retorna cuántos usuarios modificó.
+    """
+    db = get_db()
+    now = datetime.utcnow()
+    mk = month_key_utc(now)
+    batch_size = _sweep_batch_size()
+    total = 0
+
+    for name in _TIERS:
+        while True:
+            rows: List[Dict[str, Any]] = await (
+                db.users.find({f"{name}.active": True, f"{name}.active_until": {"$lte": now}}, _PROJECTION)
+                .sort(f"{name}.active_until", 1)
+                .limit(batch_size)
+                .to_list(length=batch_size)
+            )
+            if not rows:
+                break
+
+            ops = [op for op in (_plan_user(u, now, mk) for u in rows) if op is not None]
+            modified = 0
+            if ops:
+                res = await db.users.bulk_write(ops, ordered=False)
+                modified = res.modified_count
+                total += modified
+
+            if fence_token is not None:
+                await renew_lease(SWEEP_LEASE, fence_token, tier_sweep_seconds() * 5)
+            # Si nada cambió (todos extendidos en paralelo), cortar: los retoma el próximo tick
+            if len(rows) < batch_size or modified == 0:
+                break
+
+    if total:
+        # Los badges del top cacheado pueden haber cambiado
+        invalidate_top_cache()
+        logger.info("Tier sweep: %d users expired/reactivated", total)
+    return total
+
+
+async def run_tier_expiry_job() -> None:
+    """
+    Tick del scheduler: una sola instancia barre a la vez (lease).
+    """
+    token = await acquire_lease(SWEEP_LEASE, tier_sweep_seconds() * 5)
+    if token is None:
+        return
+    try:
+        await sweep_expired_tiers(fence_token=token)
+    finally:
+        await release_lease(SWEEP_LEASE, token)
@@ -1,160 +1,58 @@
 from __future__ import annotations
 
-import os
+import secrets
 from datetime import datetime, timedelta
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
 
-from app.db.connection import get_db
-from app.services.monthly_reset_service import ensure_monthly_rollover
+from app.db.request_context import get_user_doc, update_user_doc
+from app.services.economy_config import get_config
+from app.services.periods import month_key_utc
 
 
-def _get_float_env(key: str, default: float) -> float:
-    try:
-        return float(os.getenv(key, str(default)).strip())
-    except Exception:
-        return default
-
-
-def _get_int_env(key: str, default: int) -> int:
-    try:
-        return int(os.getenv(key, str(default)).strip())
-    except Exception:
-        return default
-
-
-def _tier_days() -> int:
-    return max(1, _get_int_env("TIER_DAYS", 30))
+# Parámetros: config de economía cacheada (sin parsear env en cada llamada)
+def tier_days() -> int:
+    return get_config().tier_days
 
 
 def elite_mult() -> float:
-    return max(1.0, _get_float_env("ELITE_MULT", 1.2))
+    return get_config().elite_mult
 
 
 def titan_mult() -> float:
-    return max(1.0, _get_float_env("TITAN_MULT", 1.5))
+    return get_config().titan_mult
 
 
 def elite_threshold() -> int:
-    return max(1, _get_int_env("ELITE_THRESHOLD", 200))
+    return get_config().elite_threshold
 
 
 def titan_threshold() -> int:
-    return max(1, _get_int_env("TITAN_THRESHOLD", 400))
+    return get_config().titan_threshold
 
 
 def titan_premium_redeems_required() -> int:
-    return max(1, _get_int_env("TITAN_PREMIUM_REDEEMS", 3))
+    return get_config().titan_premium_redeems
 
 
-def _month_key(dt: datetime) -> str:
-    return dt.strftime("%Y-%m")
-
-
-def _extend_from(until, now: datetime, days: int) -> datetime:
+def is_tier_active(tier: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> bool:
     """
-    Extiende desde el vencimiento actual si aún está en el futuro.
-    Si ya venció o no existe, extiende desde ahora.
+    Activo = active y sin vencer. El barrido (tier_expiry_service) apaga los
+    vencidos en background; entre barridos esto evita usar un tier ya vencido.
     """
-    if until and isinstance(until, datetime) and until > now:
-        return until + timedelta(days=days)
-    return now + timedelta(days=days)
-
-
-async def refresh_tiers(telegram_id: int) -> None:
-    """
-    0) Asegura reset mensual global (ranking mensual).
-    1) Apaga Elite/Titan si ya expiraron.
-    2) Si expiraron y el usuario sigue cumpliendo umbral del MES actual,
-       se reactivan automáticamente al instante (encadenado).
-    """
-    # Reset mensual global (no toca balance)
-    await ensure_monthly_rollover()
-
-    db = get_db()
-    now = datetime.utcnow()
-    mk = _month_key(now)
-
-    user = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"elite": 1, "titan": 1, "rank": 1, "status": 1},
-    )
-    if not user:
-        return
-
-    state = ((user.get("status") or {}).get("state")) or "active"
-    if state == "banned":
-        return
-
-    elite = user.get("elite") or {}
-    titan = user.get("titan") or {}
-    rank = user.get("rank") or {}
-
-    updates = {}
-
-    # 1) Expiración: si venció, apagar
-    elite_expired = False
-    if bool(elite.get("active")):
-        until = elite.get("active_until")
-        if until and isinstance(until, datetime) and until <= now:
-            elite_expired = True
-            updates["elite.active"] = False
-            updates["elite.active_until"] = None
-            updates["elite.forced"] = False
-            updates["elite.forced_by_admin_id"] = None
-            updates["elite.forced_note"] = None
-
-    titan_expired = False
-    if bool(titan.get("active")):
-        until = titan.get("active_until")
-        if until and isinstance(until, datetime) and until <= now:
-            titan_expired = True
-            updates["titan.active"] = False
-            updates["titan.active_until"] = None
-            updates["titan.forced"] = False
-            updates["titan.forced_by_admin_id"] = None
-            updates["titan.forced_note"] = None
-
-    if updates:
-        await db.users.update_one({"telegram_id": telegram_id}, {"$set": updates})
-
-    # 2) Reactivación automática "encadenada" si expiró y sigue cumpliendo umbral
-    user_mk = (rank.get("month_key") or mk)
-    earned = int(rank.get("earned_this_month") or 0)
-
-    # Solo aplica si estamos en el mes actual
-    if user_mk != mk:
-        return
-
-    # Si Titan expiró y sigue en umbral → reactivar Titan 30 días
-    if titan_expired and earned >= titan_threshold():
-        until = now + timedelta(days=_tier_days())
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"titan.active": True, "titan.active_until": until, "titan.forced": False}},
-        )
-        return
-
-    # Si Elite expiró y sigue en umbral → reactivar Elite 30 días
-    # (si Titan ya aplica, Titan manda)
-    if elite_expired and earned >= elite_threshold():
-        until = now + timedelta(days=_tier_days())
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"elite.active": True, "elite.active_until": until, "elite.forced": False}},
-        )
+    tier = tier or {}
+    if not bool(tier.get("active")):
+        return False
+    until = tier.get("active_until")
+    if isinstance(until, datetime) and until <= (now or datetime.utcnow()):
+        return False
+    return True
 
 
 async def get_multiplier(telegram_id: int) -> float:
     """
     Retorna multiplicador según nivel.
     """
-    await refresh_tiers(telegram_id)
-
-    db = get_db()
-    user = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"elite": 1, "titan": 1, "status": 1},
-    )
+    user = await get_user_doc(telegram_id, {"elite": 1, "titan": 1, "status": 1})
     if not user:
         return 1.0
 
@@ -162,126 +60,167 @@ async def get_multiplier(telegram_id: int) -> float:
     if state in ("blocked", "banned"):
         return 1.0
 
-    if bool(((user.get("titan") or {}).get("active"))):
+    now = datetime.utcnow()
+    if is_tier_active(user.get("titan"), now):
         return titan_mult()
-    if bool(((user.get("elite") or {}).get("active"))):
+    if is_tier_active(user.get("elite"), now):
         return elite_mult()
     return 1.0
 
 
-async def ensure_auto_tier_by_month_points(telegram_id: int) -> Tuple[bool, str]:
+def _extend_expr(tier: str, now: datetime, days: int) -> Dict[str, Any]:
     """
-    Promoción/renovación automática por puntos del mes:
-    - >= TITAN_THRESHOLD:
-        - si NO tiene Titan => Titan 30d desde ahora
-        - si YA tiene Titan => extiende +30d desde su vencimiento actual (encadenado)
-    - >= ELITE_THRESHOLD (si no aplica Titan):
-        - si NO tiene Elite => Elite 30d desde ahora
-        - si YA tiene Elite => extiende +30d desde su vencimiento actual (encadenado)
+    _extend_from evaluado en el servidor: desde el vencimiento actual si aún
+    está en el futuro, si no desde ahora.
     """
-    # Reset mensual global (por si cambió el mes)
-    await ensure_monthly_rollover()
-
-    db = get_db()
-    await refresh_tiers(telegram_id)
-
-    now = datetime.utcnow()
-    mk = _month_key(now)
-
-    user = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"rank": 1, "elite": 1, "titan": 1, "status": 1},
-    )
-    if not user:
-        return False, "Usuario no encontrado."
-
-    if ((user.get("status") or {}).get("state")) == "banned":
-        return False, "Usuario baneado."
-
-    rank = user.get("rank") or {}
-    user_mk = (rank.get("month_key") or mk)
-    if user_mk != mk:
-        return False, "Mes distinto."
+    until = {"$ifNull": [f"${tier}.active_until", now]}
+    return {
+        "$add": [
+            {"$cond": [{"$gt": [until, now]}, until, now]},
+            days * 24 * 60 * 60 * 1000,
+        ]
+    }
 
-    earned = int(rank.get("earned_this_month") or 0)
 
-    # ---- TITAN (manda sobre ELITE) ----
-    if earned >= titan_threshold():
-        titan = user.get("titan") or {}
-        active = bool(titan.get("active"))
-        until = titan.get("active_until")
-
-        new_until = _extend_from(until, now, _tier_days())
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"titan.active": True, "titan.active_until": new_until, "titan.forced": False}},
-        )
+def _grant_fields(tier: str, due: Any, now: datetime, days: int, mk: Optional[str]) -> Dict[str, Any]:
+    """
+    Campos $set de un tier: si `due` (expresión), activa/extiende; si no, deja lo que había.
+    """
+    fields: Dict[str, Any] = {
+        f"{tier}.active_until": {"$cond": [due, _extend_expr(tier, now, days), f"${tier}.active_until"]},
+        f"{tier}.active": {"$cond": [due, True, f"${tier}.active"]},
+        f"{tier}.forced": {"$cond": [due, False, f"${tier}.forced"]},
+    }
+    if mk is not None:
+        fields[f"{tier}.granted_month"] = {"$cond": [due, mk, f"${tier}.granted_month"]}
+    return fields
 
-        if active:
-            return True, f"TITAN extendido hasta {new_until.strftime('%Y-%m-%d %H:%M UTC')}"
-        return True, f"TITAN activado hasta {new_until.strftime('%Y-%m-%d %H:%M UTC')}"
 
-    # ---- ELITE ----
-    if earned >= elite_threshold():
-        if bool(((user.get("titan") or {}).get("active"))):
-            return False, "Ya TITAN"
+def _fmt_until(doc: Optional[Dict[str, Any]], tier: str) -> str:
+    until = ((doc or {}).get(tier) or {}).get("active_until")
+    if isinstance(until, datetime):
+        return until.strftime("%Y-%m-%d %H:%M UTC")
+    return "—"
 
-        elite = user.get("elite") or {}
-        active = bool(elite.get("active"))
-        until = elite.get("active_until")
 
-        new_until = _extend_from(until, now, _tier_days())
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"elite.active": True, "elite.active_until": new_until, "elite.forced": False}},
-        )
+async def ensure_auto_tier_by_month_points(telegram_id: int) -> Tuple[bool, str]:
+    """
+    Promoción/renovación automática por puntos del mes, atómica (un solo
+    find_one_and_update con pipeline; los umbrales se evalúan en el servidor
+    contra rank.earned_this_month):
+    - >= TITAN_THRESHOLD => Titan +30d (desde su vencimiento si sigue vigente)
+    - >= ELITE_THRESHOLD (si no aplica Titan y no tiene Titan vigente) => Elite +30d
+    Cada tier se otorga como máximo una vez por mes (<tier>.granted_month):
+    awards repetidos o concurrentes del mismo mes no vuelven a sumar días.
+    Quién otorgó se sabe por el propio update: tiers_last_grant.nonce es el
+    de esta llamada solo si este write eligió un tier.
+    """
+    now = datetime.utcnow()
+    mk = month_key_utc(now)
+    nonce = secrets.token_hex(8)
+    cfg = get_config()  # una sola versión de la config para toda la decisión
+    days = cfg.tier_days
+    t_thr = cfg.titan_threshold
+    e_thr = cfg.elite_threshold
+
+    earned = {"$ifNull": ["$rank.earned_this_month", 0]}
+    titan_no_vigente = {
+        "$or": [
+            {"$ne": [{"$ifNull": ["$titan.active", False]}, True]},
+            {"$lte": [{"$ifNull": ["$titan.active_until", datetime(9999, 1, 1)]}, now]},
+        ]
+    }
+
+    doc = await update_user_doc(
+        telegram_id,
+        [
+            {
+                "$set": {
+                    "_tier_grant": {
+                        "$switch": {
+                            "branches": [
+                                {
+                                    "case": {
+                                        "$and": [
+                                            {"$gte": [earned, t_thr]},
+                                            {"$ne": [{"$ifNull": ["$titan.granted_month", None]}, mk]},
+                                        ]
+                                    },
+                                    "then": "titan",
+                                },
+                                {
+                                    "case": {
+                                        "$and": [
+                                            {"$lt": [earned, t_thr]},
+                                            {"$gte": [earned, e_thr]},
+                                            {"$ne": [{"$ifNull": ["$elite.granted_month", None]}, mk]},
+                                            titan_no_vigente,
+                                        ]
+                                    },
+                                    "then": "elite",
+                                },
+                            ],
+                            "default": None,
+                        }
+                    }
+                }
+            },
+            {
+                "$set": {
+                    **_grant_fields("titan", {"$eq": ["$_tier_grant", "titan"]}, now, days, mk),
+                    **_grant_fields("elite", {"$eq": ["$_tier_grant", "elite"]}, now, days, mk),
+                    "tiers_last_grant": {
+                        "$cond": [
+                            {"$ne": ["$_tier_grant", None]},
+                            {"tier": "$_tier_grant", "month_key": mk, "at": now, "nonce": nonce},
+                            "$tiers_last_grant",
+                        ]
+                    },
+                }
+            },
+            {"$project": {"_tier_grant": 0}},
+        ],
+        projection={"titan": 1, "elite": 1, "tiers_last_grant": 1},
+        filter_extra={
+            "status.state": {"$ne": "banned"},
+            "rank.month_key": mk,
+            "rank.earned_this_month": {"$gte": min(t_thr, e_thr)},
+            "$or": [{"titan.granted_month": {"$ne": mk}}, {"elite.granted_month": {"$ne": mk}}],
+        },
+    )
+    if not doc:
+        return False, "No aplica"
 
-        if active:
-            return True, f"ELITE extendido hasta {new_until.strftime('%Y-%m-%d %H:%M UTC')}"
-        return True, f"ELITE activado hasta {new_until.strftime('%Y-%m-%d %H:%M UTC')}"
+    grant = doc.get("tiers_last_grant") or {}
+    if grant.get("nonce") != nonce:
+        return False, "No aplica"
 
-    return False, "No aplica"
+    if grant.get("tier") == "titan":
+        return True, f"TITAN activo hasta {_fmt_until(doc, 'titan')}"
+    return True, f"ELITE activo hasta {_fmt_until(doc, 'elite')}"
 
 
 async def ensure_titan_by_premium_redeems(telegram_id: int) -> Tuple[bool, str]:
     """
     Titan automático si el usuario alcanza X canjes Premium (acumulado).
     - Si ya es Titan => extiende +30d desde vencimiento (encadenado)
+    Atómico: la condición (premium_redeems_count >= X, no banned) va en el filtro
+    y la extensión se calcula en el servidor.
     """
-    await ensure_monthly_rollover()
-
-    db = get_db()
-    await refresh_tiers(telegram_id)
-
-    user = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"titan": 1, "status": 1},
-    )
-    if not user:
-        return False, "Usuario no encontrado."
-    if ((user.get("status") or {}).get("state")) == "banned":
-        return False, "Usuario baneado."
-
-    titan = user.get("titan") or {}
-    count = int(titan.get("premium_redeems_count") or 0)
-    need = titan_premium_redeems_required()
-
-    if count < need:
-        return False, "No aplica"
-
     now = datetime.utcnow()
-    active = bool(titan.get("active"))
-    until = titan.get("active_until")
-    new_until = _extend_from(until, now, _tier_days())
-
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
-        {"$set": {"titan.active": True, "titan.active_until": new_until, "titan.forced": False}},
+    cfg = get_config()
+    doc = await update_user_doc(
+        telegram_id,
+        [{"$set": _grant_fields("titan", True, now, cfg.tier_days, None)}],
+        projection={"titan": 1},
+        filter_extra={
+            "status.state": {"$ne": "banned"},
+            "titan.premium_redeems_count": {"$gte": cfg.titan_premium_redeems},
+        },
     )
-
-    if active:
-        return True, f"Titan extendido por Premium hasta {new_until.strftime('%Y-%m-%d %H:%M UTC')}"
-    return True, f"Titan activado por Premium hasta {new_until.strftime('%Y-%m-%d %H:%M UTC')}"
+    if not doc:
+        return False, "No aplica"
+    return True, f"Titan activo por Premium hasta {_fmt_until(doc, 'titan')}"
 
 
 # =========================
@@ -295,10 +234,7 @@ def _valid_days(days: int) -> int:
 
 
 async def admin_set_elite(telegram_id: int, admin_id: int, days: int = 30, note: str = "") -> Tuple[bool, str]:
-    db = get_db()
-    await refresh_tiers(telegram_id)
-
-    user = await db.users.find_one({"telegram_id": telegram_id}, {"status": 1})
+    user = await get_user_doc(telegram_id, {"status": 1})
     if not user:
         return False, "Usuario no encontrado."
     if ((user.get("status") or {}).get("state")) == "banned":
@@ -307,8 +243,8 @@ async def admin_set_elite(telegram_id: int, admin_id: int, days: int = 30, note:
     now = datetime.utcnow()
     until = now + timedelta(days=_valid_days(days))
 
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
+    await update_user_doc(
+        telegram_id,
         {
             "$set": {
                 "elite.active": True,
@@ -323,10 +259,7 @@ async def admin_set_elite(telegram_id: int, admin_id: int, days: int = 30, note:
 
 
 async def admin_set_titan(telegram_id: int, admin_id: int, days: int = 30, note: str = "") -> Tuple[bool, str]:
-    db = get_db()
-    await refresh_tiers(telegram_id)
-
-    user = await db.users.find_one({"telegram_id": telegram_id}, {"status": 1})
+    user = await get_user_doc(telegram_id, {"status": 1})
     if not user:
         return False, "Usuario no encontrado."
     if ((user.get("status") or {}).get("state")) == "banned":
@@ -335,8 +268,8 @@ async def admin_set_titan(telegram_id: int, admin_id: int, days: int = 30, note:
     now = datetime.utcnow()
     until = now + timedelta(days=_valid_days(days))
 
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
+    await update_user_doc(
+        telegram_id,
         {
             "$set": {
                 "titan.active": True,
@@ -351,9 +284,8 @@ async def admin_set_titan(telegram_id: int, admin_id: int, days: int = 30, note:
 
 
 async def admin_unset_elite(telegram_id: int, admin_id: int) -> Tuple[bool, str]:
-    db = get_db()
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
+    await update_user_doc(
+        telegram_id,
         {
             "$set": {
                 "elite.active": False,
@@ -368,9 +300,8 @@ async def admin_unset_elite(telegram_id: int, admin_id: int) -> Tuple[bool, str]
 
 
 async def admin_unset_titan(telegram_id: int, admin_id: int) -> Tuple[bool, str]:
-    db = get_db()
-    await db.users.update_one(
-        {"telegram_id": telegram_id},
+    await update_user_doc(
+        telegram_id,
         {
             "$set": {
                 "titan.active": False,
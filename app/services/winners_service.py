@@ -4,10 +4,8 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 from app.db.connection import get_db
-
-
-def _month_key(dt: datetime) -> str:
-    return dt.strftime("%Y-%m")
+from app.db.request_context import get_user_doc
+from app.services.periods import month_key_utc
 
 
 def _safe_username(u: Dict[str, Any]) -> str:
@@ -21,11 +19,7 @@ def _safe_username(u: Dict[str, Any]) -> str:
 
 
 async def get_user_month_points(telegram_id: int, month_key: str) -> int:
-    db = get_db()
-    u = await db.users.find_one(
-        {"telegram_id": telegram_id},
-        {"rank": 1, "status": 1},
-    )
+    u = await get_user_doc(telegram_id, {"rank": 1, "status": 1})
     if not u:
         return 0
     if ((u.get("status") or {}).get("state")) == "banned":
@@ -109,7 +103,7 @@ async def clear_winners(month_key: str, admin_id: int) -> Tuple[bool, str]:
 
 async def get_winners(month_key: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]]]:
     db = get_db()
-    mk = month_key or _month_key(datetime.utcnow())
+    mk = month_key or month_key_utc(datetime.utcnow())
 
     doc = await db.monthly_winners.find_one({"month_key": mk})
     if not doc:
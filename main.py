@@ -16,6 +16,22 @@ from app.bot.handlers.redeem import router as redeem_router
 from app.bot.handlers.ranking import router as ranking_router
 from app.bot.handlers.winners import router as winners_router
 from app.db.connection import init_db
+from app.bot.middlewares.access_gate import AccessGateMiddleware
+from app.bot.middlewares.request_context import RequestContextMiddleware
+from app.services.economy_config import check_economy_config_version, config_check_seconds, load_economy_config
+from app.services.monthly_reset_service import rollover_check_seconds, run_monthly_rollover_job
+from app.services.scheduler_service import register_job, start_scheduler, stop_scheduler
+from app.services.leaderboard_index import leaderboard_resync_seconds, sync_leaderboard
+from app.services.achievements_service import backfill_achievements
+from app.services.ranking_service import backfill_all_time_ranking
+from app.services.rank_histogram_service import histogram_refresh_seconds, refresh_rank_histogram_job
+from app.services.access_gate import access_gate_resync_seconds, sync_access_gate
+from app.services.account_expiry_service import account_sweep_seconds, run_account_expiry_job
+from app.services.notification_service import notification_send_seconds, send_pending_notifications
+from app.services.tier_expiry_service import run_tier_expiry_job, tier_sweep_seconds
+from app.services.last_seen_buffer import flush_last_seen, last_seen_flush_seconds
+from app.services.ledger_writer import log_ledger_writer_metrics, start_ledger_writer, stop_ledger_writer
+from app.services.ledger_service import ledger_reconcile_seconds, reconcile_ledger_cache
 
 
 async def main():
@@ -31,6 +47,17 @@ async def main():
     dp = Dispatcher(storage=MemoryStorage())
 
     await init_db()
+    await load_economy_config()
+    ledger_writer = start_ledger_writer()
+    await backfill_all_time_ranking()
+    await backfill_achievements()
+    await sync_leaderboard()
+    await sync_access_gate()
+
+    # Baneados/bloqueados se cortan en memoria, antes de cualquier lectura a Mongo
+    dp.update.outer_middleware(AccessGateMiddleware())
+    # Carga el usuario una vez por update (cache del request para los services)
+    dp.update.outer_middleware(RequestContextMiddleware())
 
     dp.include_router(start_router)
     dp.include_router(policy_router)
@@ -41,7 +68,29 @@ async def main():
     dp.include_router(ranking_router)
     dp.include_router(winners_router)
 
-    await dp.start_polling(bot)
+    # Trabajos en background (nunca bloquean updates de usuarios)
+    register_job("economy_config", config_check_seconds(), check_economy_config_version)
+    # Corre también al arrancar: entries que quedaron sin cache por una caída
+    register_job("ledger_reconcile", ledger_reconcile_seconds(), reconcile_ledger_cache)
+    register_job("monthly_rollover", rollover_check_seconds(), run_monthly_rollover_job)
+    register_job("leaderboard_resync", leaderboard_resync_seconds(), sync_leaderboard)
+    register_job("rank_histogram", histogram_refresh_seconds(), refresh_rank_histogram_job)
+    register_job("tier_expiry", tier_sweep_seconds(), run_tier_expiry_job)
+    register_job("last_seen_flush", last_seen_flush_seconds(), flush_last_seen)
+    register_job("access_gate", access_gate_resync_seconds(), sync_access_gate)
+    register_job("account_expiry", account_sweep_seconds(), run_account_expiry_job)
+    register_job("notifications", notification_send_seconds(), lambda: send_pending_notifications(bot))
+    if ledger_writer is not None:
+        register_job("ledger_writer_metrics", 60, log_ledger_writer_metrics)
+    start_scheduler()
+
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await stop_scheduler()
+        # Escribe lo que quede en el buffer del ledger antes de salir
+        await stop_ledger_writer()
+        await flush_last_seen()
 
 
 if __name__ == "__main__":
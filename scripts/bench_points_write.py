@@ -0,0 +1,74 @@
+"""
+Benchmark de latencia por premio de puntos (create_points_entry).
+
+Uso (desde la raíz del repo, con MONGO_URI apuntando al cluster a medir):
+    python -m scripts.bench_points_write --n 200
+
+Escribe en una base descartable (<MONGO_DB_NAME>_bench_<pid>, con los mismos
+índices) y la elimina al terminar: ledger, users y month_stats de la base real
+no se tocan (las stats del mes no se pueden "restar" después).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from app.db.connection import get_client, get_db, init_db, supports_transactions
+from app.services.ledger_service import CAT_TASK, TYPE_EARN, create_points_entry
+
+BENCH_TELEGRAM_ID = -900000001
+
+
+def _pct(values, p: float) -> float:
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+
+async def run(n: int, warmup: int) -> None:
+    base_name = os.getenv("MONGO_DB_NAME", "mtf_ascenso")
+    os.environ["MONGO_DB_NAME"] = f"{base_name}_bench_{os.getpid()}"
+    await init_db()
+    db = get_db()
+
+    try:
+        for _ in range(warmup):
+            await create_points_entry(BENCH_TELEGRAM_ID, TYPE_EARN, CAT_TASK, "BENCH", 1)
+
+        samples_ms = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            await create_points_entry(BENCH_TELEGRAM_ID, TYPE_EARN, CAT_TASK, "BENCH", 1)
+            samples_ms.append((time.perf_counter() - t0) * 1000)
+
+        user = await db.users.find_one({"telegram_id": BENCH_TELEGRAM_ID}, {"points.balance_cached": 1})
+        balance = int(((user or {}).get("points") or {}).get("balance_cached") or 0)
+
+        print(f"transactions: {'on' if supports_transactions() else 'off'}")
+        print(f"awards: {n}  (warmup {warmup})")
+        print(
+            "latency ms: "
+            f"mean={statistics.mean(samples_ms):.2f} "
+            f"p50={_pct(samples_ms, 50):.2f} "
+            f"p95={_pct(samples_ms, 95):.2f} "
+            f"p99={_pct(samples_ms, 99):.2f} "
+            f"max={max(samples_ms):.2f}"
+        )
+        print(f"balance check: {balance} == {n + warmup} -> {'OK' if balance == n + warmup else 'MISMATCH'}")
+    finally:
+        await get_client().drop_database(db.name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latencia de create_points_entry")
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.n, args.warmup))
+
+
+if __name__ == "__main__":
+    main()